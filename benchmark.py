@@ -0,0 +1,642 @@
+"""
+Offline benchmarks for the slide extractor.
+
+Every benchmark renders its own synthetic lecture video with cv2.VideoWriter,
+so nothing has to be downloaded; the download check serves its payload
+from a local HTTP server.
+
+Usage:
+    python benchmark.py sampling [--minutes 10] [--size 1920x1080]
+    python benchmark.py matching [--sizes 1 10 100 1000]
+    python benchmark.py segments [--minutes 10] [--workers 1 2 4 8]
+    python benchmark.py adaptive [--minutes 10] [--interval 10]
+    python benchmark.py suite [--minutes 3] [--frame-skips 15 30 60] [--json results.json]
+    python benchmark.py download [--size-kb 1024] [--chunk-kb 64]
+    python benchmark.py stream [--minutes 1] [--write-seconds 5]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from main_extract import FingerprintStore, TrainedModelIndex, UltimateSlideProcessor, peak_rss_mb
+
+
+def render_slide(index, size, visible_lines=6):
+    """Draw a simple text slide; the same index always gives the same image."""
+    width, height = size
+    rng = np.random.default_rng(index)
+    slide = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.rectangle(slide, (0, 0), (width, height // 8), (120, 60, 20), -1)
+    cv2.putText(slide, f"Slide {index}", (width // 20, height // 11),
+                cv2.FONT_HERSHEY_SIMPLEX, height / 400, (255, 255, 255), 3)
+    for line in range(6):
+        y = height // 4 + line * height // 10
+        words = " ".join(f"w{rng.integers(1000)}" for _ in range(rng.integers(3, 8)))
+        if line < visible_lines:
+            cv2.putText(slide, words, (width // 12, y),
+                        cv2.FONT_HERSHEY_SIMPLEX, height / 700, (30, 30, 30), 2)
+    return slide
+
+
+def render_break(size):
+    """The "we'll be right back" card a trainer folder is meant to filter out."""
+    width, height = size
+    card = np.full((height, width, 3), (40, 40, 40), dtype=np.uint8)
+    cv2.circle(card, (width // 2, height // 3), height // 8, (0, 140, 255), -1)
+    cv2.putText(card, "We'll be right back", (width // 5, height * 2 // 3),
+                cv2.FONT_HERSHEY_SIMPLEX, height / 300, (230, 230, 230), 4)
+    return card
+
+
+def make_lecture_video(path, seconds, fps=30, size=(1920, 1080), slide_seconds=20):
+    """
+    Write a static-slide lecture to path.
+
+    Args:
+        slide_seconds (float or list): Dwell time of every slide, or a list
+            of dwell times that is cycled through
+
+    Returns:
+        list: Frame index at which each slide starts
+    """
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    dwell_times = slide_seconds if isinstance(slide_seconds, list) else [slide_seconds]
+    total_frames = int(seconds * fps)
+    transitions = []
+    next_transition = 0
+    slide = None
+    for frame_index in range(total_frames):
+        if frame_index == next_transition:
+            transitions.append(frame_index)
+            slide = render_slide(len(transitions) - 1, size)
+            next_transition += max(1, int(dwell_times[(len(transitions) - 1) % len(dwell_times)] * fps))
+        writer.write(slide)
+    writer.release()
+    return transitions
+
+
+def bench_sampling(args):
+    size = tuple(int(v) for v in args.size.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        video = Path(tmp) / "lecture.mp4"
+        print(f"Rendering {args.minutes} min synthetic lecture at {args.size}...")
+        make_lecture_video(video, args.minutes * 60, size=size)
+
+        processor = UltimateSlideProcessor(frame_skip=args.frame_skip)
+
+        def run(label, sampler):
+            cap = cv2.VideoCapture(str(video))
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            start = time.perf_counter()
+            samples = sum(1 for _ in sampler(cap))
+            elapsed = time.perf_counter() - start
+            cap.release()
+            print(f"{label:<28} {samples:>6} samples  {elapsed:7.2f} s  "
+                  f"{total_frames / elapsed:8.1f} video frames/s")
+
+        def read_every_frame(cap):
+            frame_index = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frame_index % processor.frame_skip == 0:
+                    yield frame_index, frame
+                frame_index += 1
+
+        run("read() every frame (before)", read_every_frame)
+        run("grab()/retrieve()", processor.sample_frames)
+        processor.sample_interval = args.frame_skip / 30
+        cap = cv2.VideoCapture(str(video))
+        mode = "seek" if processor.seeks_samples(cap, cap.get(cv2.CAP_PROP_FPS)) else "grab"
+        cap.release()
+        run(f"{mode} every {processor.sample_interval:g} s", processor.sample_frames)
+
+
+def add_noise(image, seed=0):
+    """Blur and speckle an image the way re-encoding and capture noise would."""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 255, image.shape, dtype=np.uint8)
+    return cv2.addWeighted(cv2.GaussianBlur(image, (3, 3), 0), 0.9, noise, 0.1, 0)
+
+
+def bench_matching(args):
+    processor = UltimateSlideProcessor()
+    size = processor.feature_size
+    print(f"Computing descriptors for {max(args.sizes)} synthetic trainer images...")
+    trained = [processor.extract_features(render_slide(i, size)) for i in range(max(args.sizes))]
+    # Half the queries are noisy copies of trainer images, half are unseen slides
+    queries = [processor.extract_features(add_noise(render_slide(i, size), i))
+               for i in (0, 1, 10**6, 10**6 + 1)]
+    baseline_matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+
+    print(f"{'images':>7} {'per-image loop':>16} {'index build':>12} {'index query':>12}  hits")
+    for count in sorted(args.sizes):
+        descriptor_sets = trained[:count]
+        baseline = "skipped"
+        if count <= args.baseline_limit:
+            start = time.perf_counter()
+            for frame_des in queries:
+                for trained_des in descriptor_sets:
+                    baseline_matcher.match(frame_des, trained_des)
+            baseline = f"{(time.perf_counter() - start) / len(queries) * 1000:.0f} ms"
+
+        start = time.perf_counter()
+        index = TrainedModelIndex(descriptor_sets)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        hits = [index.scores(frame_des).max() >= processor.trained_match_threshold for frame_des in queries]
+        query = (time.perf_counter() - start) / len(queries)
+        print(f"{count:>7} {baseline:>16} {build * 1000:>9.0f} ms {query * 1000:>9.0f} ms  "
+              f"{''.join('x' if hit else '.' for hit in hits)}")
+
+
+def bench_segments(args):
+    size = tuple(int(v) for v in args.size.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        video = Path(tmp) / "lecture.mp4"
+        print(f"Rendering {args.minutes} min synthetic lecture at {args.size}...")
+        make_lecture_video(video, args.minutes * 60, size=size)
+
+        reference = None
+        baseline = None
+        for workers in args.workers:
+            processor = UltimateSlideProcessor(segment_workers=workers if workers > 1 else 0)
+            processor.video_path = video
+            processor.output_folder = Path(tmp) / f"slides_{workers}"
+            processor.output_folder.mkdir()
+            start = time.perf_counter()
+            processor.process_video()
+            elapsed = time.perf_counter() - start
+            slides = [cv2.imread(str(path)).tobytes() for path in sorted(processor.output_folder.iterdir())]
+            reference = reference if reference is not None else slides
+            baseline = baseline or elapsed
+            print(f"{workers:>3} workers  {elapsed:7.2f} s  {baseline / elapsed:5.2f}x  "
+                  f"{len(slides)} slides  {'matches' if slides == reference else 'DIFFERS from'} first run")
+
+
+def bench_adaptive(args):
+    size = tuple(int(v) for v in args.size.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        video = Path(tmp) / "lecture.mp4"
+        print(f"Rendering {args.minutes} min synthetic lecture at {args.size} with 3-45 s slides...")
+        transitions = make_lecture_video(video, args.minutes * 60, size=size, slide_seconds=[45, 3, 20, 8, 30, 4])
+
+        runs = [
+            (f"frame_skip={args.frame_skip}", {"frame_skip": args.frame_skip}),
+            (f"adaptive {args.interval:g} s", {"adaptive_interval": args.interval}),
+        ]
+        for label, options in runs:
+            processor = UltimateSlideProcessor(**options)
+            cap = cv2.VideoCapture(str(video))
+            start = time.perf_counter()
+            samples = [frame_index for frame_index, _ in processor.sample_frames(cap)]
+            elapsed = time.perf_counter() - start
+            cap.release()
+            # How long after each true transition the first analyzed frame comes
+            lags = []
+            for i, transition in enumerate(transitions):
+                following = transitions[i + 1] if i + 1 < len(transitions) else float("inf")
+                hits = [sample for sample in samples if transition <= sample < following]
+                if hits:
+                    lags.append(hits[0] - transition)
+            missed = len(transitions) - len(lags)
+            print(f"{label:<18} {elapsed:7.2f} s  {len(samples):>6} samples  {missed} of {len(transitions)} "
+                  f"slides missed  lag mean {np.mean(lags):.1f} / max {max(lags)} frames")
+
+
+def lecture_script(seconds, seed=0):
+    """
+    A random but reproducible lecture plan with repeats, breaks and builds.
+
+    Returns:
+        list: One dict per shown slide with "slide" (an index, or "break"),
+            "seconds" (dwell time), "builds" (bullet reveal steps) and
+            "fade" (cross-fade in from the previous slide)
+    """
+    rng = np.random.default_rng(seed)
+    script = []
+    shown = []
+    total = 0
+    while total < seconds:
+        roll = rng.random()
+        if shown and roll < 0.1 and script[-1]["slide"] != "break":
+            slide = "break"
+        elif len(shown) > 2 and roll < 0.3:
+            slide = int(rng.choice(shown[:-1]))
+        else:
+            slide = len(shown)
+            shown.append(slide)
+        builds = int(rng.integers(2, 4)) if slide != "break" and rng.random() < 0.3 else 1
+        dwell = float(rng.choice([3, 8, 15, 30, 45]))
+        script.append({"slide": slide, "seconds": dwell, "builds": builds, "fade": bool(rng.random() < 0.5)})
+        total += dwell
+    return script
+
+
+def slide_states(entry, size):
+    """Images of one script entry, one per build step."""
+    if entry["slide"] == "break":
+        return [render_break(size)]
+    builds = entry["builds"]
+    return [render_slide(entry["slide"], size, 6 * (step + 1) // builds) for step in range(builds)]
+
+
+def make_scripted_lecture(path, script, fps=30, size=(1280, 720), fade_seconds=0.5, overlay=True, seed=0):
+    """
+    Render a lecture_script to path.
+
+    Fading entries blend in from the previous image over fade_seconds. With
+    overlay set, a presenter webcam box with a moving head and sensor noise
+    covers the bottom-right corner of every frame.
+
+    Returns:
+        list: Ground truth, the script entries with "start" and "end" frames added
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    box_w, box_h = width // 5, height // 4
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    truth = []
+    frame_index = 0
+    previous = None
+    for entry in script:
+        states = slide_states(entry, size)
+        start = frame_index
+        step_frames = max(1, int(entry["seconds"] * fps / len(states)))
+        fade_frames = int(fade_seconds * fps) if entry["fade"] and previous is not None else 0
+        for state in states:
+            for i in range(step_frames):
+                if frame_index - start < fade_frames:
+                    alpha = (frame_index - start + 1) / (fade_frames + 1)
+                    frame = cv2.addWeighted(state, alpha, previous, 1 - alpha, 0)
+                else:
+                    frame = state.copy()
+                if overlay:
+                    box = frame[height - box_h:, width - box_w:]
+                    box[:] = (90, 110, 100)
+                    sway = int(box_w * 0.15 * np.sin(frame_index / fps))
+                    cv2.circle(box, (box_w // 2 + sway, box_h // 2), box_h // 4, (150, 170, 210), -1)
+                    noise = rng.integers(-12, 13, box.shape, dtype=np.int16)
+                    box[:] = np.clip(box + noise, 0, 255).astype(np.uint8)
+                writer.write(frame)
+                frame_index += 1
+        previous = states[-1]
+        truth.append({**entry, "start": start, "end": frame_index})
+    writer.release()
+    return truth
+
+
+def score_slides(folder, truth, size, match_threshold=0.9):
+    """
+    Precision and recall of the slides saved in folder against the ground truth.
+
+    A saved image counts as a slide when its fingerprint matches a clean
+    render of some build step of a shown slide. Fade blends, break cards and
+    anything else are false positives. Saving a slide again (for a build
+    step or a repeat) is reported as redundant, not as an error. A run
+    that saved nothing has precision 0.
+    """
+    references = []
+    for entry in truth:
+        for state in slide_states(entry, size):
+            references.append((entry["slide"], FingerprintStore.fingerprint(state)))
+    expected = {entry["slide"] for entry in truth if entry["slide"] != "break"}
+    found = set()
+    correct = redundant = 0
+    saved = sorted(path for path in Path(folder).iterdir() if path.is_file())
+    for path in saved:
+        fingerprint = FingerprintStore.fingerprint(cv2.imread(str(path)))
+        similarity, slide = max(((FingerprintStore.similarity(fingerprint, reference), slide)
+                                 for slide, reference in references), key=lambda match: match[0])
+        if similarity < match_threshold or slide == "break":
+            continue
+        correct += 1
+        if slide in found:
+            redundant += 1
+        found.add(slide)
+    return {
+        "saved": len(saved),
+        "precision": correct / len(saved) if saved else 0.0,
+        "recall": len(found) / len(expected) if expected else 1.0,
+        "redundant": redundant,
+    }
+
+
+def run_suite_config(video, output, trainer, options):
+    processor = UltimateSlideProcessor(**options, checkpoint_seconds=None, video_path=video,
+                                       output_folder=output, trainer_folder=trainer)
+    start = time.perf_counter()
+    processor.process_video()
+    return {"seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb(), "counts": processor.counts}
+
+
+def bench_suite(args):
+    size = tuple(int(v) for v in args.size.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        video = tmp / "lecture.mp4"
+        script = lecture_script(args.minutes * 60, args.seed)
+        print(f"Rendering {args.minutes} min scripted lecture at {args.size} "
+              f"({len(script)} slides shown, {sum(e['slide'] == 'break' for e in script)} breaks)...")
+        truth = make_scripted_lecture(video, script, size=size, seed=args.seed)
+        total_frames = truth[-1]["end"]
+        trainers = {"none": tmp / "trainer_empty", "break": tmp / "trainer_break"}
+        for folder in trainers.values():
+            folder.mkdir()
+        cv2.imwrite(str(trainers["break"] / "break.png"), render_break(size))
+
+        runs = [(frame_skip, threshold, trainer)
+                for frame_skip in args.frame_skips for threshold in args.thresholds for trainer in args.trainers]
+        results = []
+        print(f"{'frame_skip':>10} {'threshold':>9} {'trainer':>7} {'wall s':>7} {'fps':>7} {'peak MB':>8} "
+              f"{'saved':>5} {'precision':>9} {'recall':>6} {'redundant':>9}")
+        context = multiprocessing.get_context("spawn")
+        for frame_skip, threshold, trainer in runs:
+            output = tmp / f"out_{frame_skip}_{threshold}_{trainer}"
+            options = {"frame_skip": frame_skip, "duplicate_threshold": threshold}
+            # A fresh process per run, so peak memory belongs to that run alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                run = pool.submit(run_suite_config, str(video), str(output), str(trainers[trainer]), options).result()
+            score = score_slides(output, truth, size)
+            result = {"frame_skip": frame_skip, "duplicate_threshold": threshold, "trainer": trainer,
+                      "fps": total_frames / run["seconds"], **run, **score}
+            results.append(result)
+            print(f"{frame_skip:>10} {threshold:>9g} {trainer:>7} {run['seconds']:>7.2f} {result['fps']:>7.0f} "
+                  f"{run['peak_rss_mb'] or 0:>8.0f} {score['saved']:>5} {score['precision']:>9.2f} "
+                  f"{score['recall']:>6.2f} {score['redundant']:>9}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "minutes": args.minutes, "size": args.size, "seed": args.seed, "total_frames": total_frames,
+            "results": results,
+        }, indent=2))
+    # A run that found no slide at all always fails, gates or not
+    failed = [r for r in results
+              if r["recall"] == 0
+              or (args.min_recall is not None and r["recall"] < args.min_recall)
+              or (args.min_precision is not None and r["precision"] < args.min_precision)]
+    for r in failed:
+        print(f"FAILED: frame_skip={r['frame_skip']} threshold={r['duplicate_threshold']:g} trainer={r['trainer']} "
+              f"precision {r['precision']:.2f} recall {r['recall']:.2f}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+class PayloadHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's payload at any URL, honouring Range only when the
+    server's ranges flag is set. A range starting at an offset in short_once
+    is cut off halfway the first time it is asked for.
+    """
+
+    def do_GET(self):
+        server = self.server
+        data = server.payload
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        short = False
+        if server.ranges and match:
+            start = int(match[1])
+            end = min(int(match[2]) if match[2] else len(data) - 1, len(data) - 1)
+            body = data[start:end + 1]
+            with server.lock:
+                server.requests.append((start, end))
+                short = start in server.short_once
+                server.short_once.discard(start)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            body = data
+            with server.lock:
+                server.requests.append((0, len(data) - 1))
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body[:len(body) // 2] if short else body)
+        except ConnectionError:
+            pass  # A stopped download hangs up mid-chunk
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_download(args):
+    from videodownloader import RangeDownload
+
+    payload = np.random.default_rng(0).integers(0, 256, args.size_kb * 1024, dtype=np.uint8).tobytes()
+    chunk_size = args.chunk_kb * 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PayloadHandler)
+    server.payload, server.ranges, server.short_once = payload, True, set()
+    server.requests, server.lock = [], threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+
+    def download(path, stop_after=None, **options):
+        """Run one RangeDownload; returns (bytes reported to progress, whether it was stopped)."""
+        received = [0]
+        lock = threading.Lock()
+        stop_event = threading.Event()
+
+        def progress(count):
+            with lock:
+                received[0] += count
+                if stop_after is not None and received[0] >= stop_after:
+                    stop_event.set()
+
+        server.requests.clear()
+        try:
+            RangeDownload(url, str(path), chunk_size=chunk_size, progress=progress, stop_event=stop_event,
+                          **options).run()
+        except InterruptedError:
+            return received[0], True
+        return received[0], False
+
+    def complete(path, received):
+        return (Path(path).read_bytes() == payload and received == len(payload)
+                and not os.path.exists(f"{path}.part") and not os.path.exists(f"{path}.part.json"))
+
+    def fetched_chunks():
+        return [start // chunk_size for start, end in server.requests if end > start]
+
+    def resumed(path, **options):
+        """Stop a download halfway, then restart it: it must finish without refetching saved chunks."""
+        download(path, stop_after=len(payload) // 2, **options)
+        with open(f"{path}.part.json") as f:
+            saved = set(json.load(f)["done"])
+        received, _ = download(path, **options)
+        return bool(saved) and complete(path, received) and not saved & set(fetched_chunks())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        chunks = (len(payload) + chunk_size - 1) // chunk_size
+        print(f"Serving {args.size_kb} KB in {chunks} chunks of {args.chunk_kb} KB from {url}")
+
+        received, _ = download(tmp / "ranges.mp4")
+        checks = [("parallel ranges", complete(tmp / "ranges.mp4", received)
+                   and sorted(fetched_chunks()) == list(range(chunks)))]
+
+        server.short_once = {3 * chunk_size}
+        received, _ = download(tmp / "retry.mp4")
+        checks.append(("short chunk retried", complete(tmp / "retry.mp4", received)
+                       and fetched_chunks().count(3) == 2))
+
+        checks.append(("resume from .part.json", resumed(tmp / "resume.mp4")))
+
+        received, _ = download(tmp / "ordered.mp4", in_order=True)
+        checks.append(("in order", complete(tmp / "ordered.mp4", received)))
+        checks.append(("in order resume", resumed(tmp / "ordered_resume.mp4", in_order=True)))
+
+        server.ranges = False
+        received, _ = download(tmp / "plain.mp4")
+        checks.append(("no Range support", complete(tmp / "plain.mp4", received) and len(server.requests) == 2))
+
+    server.shutdown()
+    for label, passed in checks:
+        print(f"{label:<24} {'ok' if passed else 'FAILED'}")
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def write_gradually(source, path, seconds, marker=None, blocks=50):
+    """
+    Copy source to path in blocks spread over seconds, like a download would,
+    with marker present until the copy is done.
+
+    Returns:
+        float: perf_counter time at which the last byte was written
+    """
+    data = Path(source).read_bytes()
+    block = len(data) // blocks + 1
+    with open(path, "ab") as f:
+        for offset in range(0, len(data), block):
+            f.write(data[offset:offset + block])
+            f.flush()
+            time.sleep(seconds / blocks)
+    written = time.perf_counter()
+    if marker:
+        os.remove(marker)
+    return written
+
+
+def bench_stream(args):
+    size = tuple(int(v) for v in args.size.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        video = tmp / "lecture.mkv"
+        print(f"Rendering {args.minutes} min synthetic lecture at {args.size} as MKV...")
+        make_lecture_video(video, args.minutes * 60, size=size, slide_seconds=10)
+
+        def slides(folder):
+            return [path.read_bytes() for path in sorted(Path(folder).glob("*"))]
+
+        def extract(path, output, progress_callback=None, **options):
+            processor = UltimateSlideProcessor(**options, checkpoint_seconds=None, video_path=path,
+                                               output_folder=output, trainer_folder=tmp / "trainer")
+            completed = processor.process_video(progress_callback)
+            return completed, processor.progress.error
+
+        checks = [extract(video, tmp / "reference")[0]]
+        reference = slides(tmp / "reference")
+        print(f"{'completion signal':<18} {'result':>8} {'slides':>6} {'first slide':>12} {'done after write':>17}")
+        for signal in ("marker", "callable"):
+            growing = tmp / f"growing_{signal}.mkv"
+            growing.touch()
+            marker = None
+            if signal == "marker":
+                marker = Path(f"{growing}.part.json")
+                marker.write_text("{}")
+            first_slide = []
+
+            def on_progress(snapshot):
+                if snapshot["unique"] and not first_slide:
+                    first_slide.append(time.perf_counter())
+
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                start = time.perf_counter()
+                writing = pool.submit(write_gradually, video, growing, args.write_seconds, marker)
+                finished = writing.done if signal == "callable" else None
+                completed, error = extract(growing, tmp / f"stream_{signal}", on_progress,
+                                           stream=True, stream_finished=finished)
+                ended = time.perf_counter()
+                written = writing.result()
+            saved = slides(tmp / f"stream_{signal}")
+            # Slides must match a run over the complete file, and the first must come while it was still written
+            passed = completed and saved == reference and bool(first_slide) and first_slide[0] < written
+            checks.append(passed)
+            first = f"{first_slide[0] - start:>10.2f} s" if first_slide else f"{'none':>12}"
+            print(f"{signal:<18} {'ok' if passed else 'FAILED':>8} {len(saved):>6} {first} "
+                  f"{ended - written:>15.2f} s" + (f"  ({error})" if error else ""))
+    return 0 if all(checks) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slide extractor benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    sampling = subparsers.add_parser("sampling", help="Frame sampling throughput")
+    sampling.add_argument("--minutes", type=float, default=10)
+    sampling.add_argument("--size", default="1920x1080")
+    sampling.add_argument("--frame-skip", type=int, default=30)
+    sampling.set_defaults(func=bench_sampling)
+
+    matching = subparsers.add_parser("matching", help="Trained-model matching across trainer sizes")
+    matching.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    matching.add_argument("--baseline-limit", type=int, default=100,
+                          help="Largest trainer size to time the old per-image loop on")
+    matching.set_defaults(func=bench_matching)
+
+    segments = subparsers.add_parser("segments", help="Segment-parallel speedup against worker count")
+    segments.add_argument("--minutes", type=float, default=10)
+    segments.add_argument("--size", default="1920x1080")
+    segments.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    segments.set_defaults(func=bench_segments)
+
+    adaptive = subparsers.add_parser("adaptive", help="Fixed stride against adaptive transition search")
+    adaptive.add_argument("--minutes", type=float, default=10)
+    adaptive.add_argument("--size", default="1920x1080")
+    adaptive.add_argument("--frame-skip", type=int, default=150)
+    adaptive.add_argument("--interval", type=float, default=10)
+    adaptive.set_defaults(func=bench_adaptive)
+
+    suite = subparsers.add_parser("suite", help="Speed and slide precision/recall on a scripted lecture")
+    suite.add_argument("--minutes", type=float, default=3)
+    suite.add_argument("--size", default="1280x720")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--frame-skips", type=int, nargs="+", default=[15, 30, 60])
+    suite.add_argument("--thresholds", type=float, nargs="+", default=[0.95, 0.98])
+    suite.add_argument("--trainers", nargs="+", default=["none", "break"], choices=("none", "break"),
+                       help="Run without a trainer and/or with the break card as trainer image")
+    suite.add_argument("--json", help="Write the results to this file")
+    suite.add_argument("--min-recall", type=float,
+                       help="Exit with 1 if any run's recall is lower (recall 0 always fails)")
+    suite.add_argument("--min-precision", type=float, help="Exit with 1 if any run's precision is lower")
+    suite.set_defaults(func=bench_suite)
+
+    download = subparsers.add_parser("download", help="Check range downloads against a local HTTP server")
+    download.add_argument("--size-kb", type=int, default=1024)
+    download.add_argument("--chunk-kb", type=int, default=64)
+    download.set_defaults(func=bench_download)
+
+    stream = subparsers.add_parser("stream", help="Check extraction from a file that is still being written")
+    stream.add_argument("--minutes", type=float, default=1)
+    stream.add_argument("--size", default="640x360")
+    stream.add_argument("--write-seconds", type=float, default=5, help="How long writing the file takes")
+    stream.set_defaults(func=bench_stream)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
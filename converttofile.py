@@ -1,64 +1,314 @@
-
+import argparse
+import io
 import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 from pptx import Presentation
 from pptx.util import Inches
-import img2pdf
 
-def convert_images_to_pdf_pptx(input_folder, pdf_output, pptx_output):
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+SLIDE_WIDTH_INCHES = 10  # Width of the default python-pptx presentation
+PAGE_DPI = 96  # Pixel density used for PDF page sizes, same default as img2pdf
+QUALITY_STEPS = (85, 75, 65, 55, 45, 35)
+
+
+def encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def prepare_image(path, max_width=None, max_height=None, quality=None, byte_budget=None):
+    """
+    Produce the single encoded JPEG copy of a slide shared by every output.
+
+    Untouched JPEGs are passed through byte for byte; everything else is
+    downscaled to fit the limits and re-encoded, lowering quality (and then
+    size) until the image fits its byte budget.
+
+    Args:
+        path (str): Image file to prepare
+        max_width (int): Maximum width in pixels, or None
+        max_height (int): Maximum height in pixels, or None
+        quality (int): JPEG quality for re-encoding, or None to keep JPEGs as-is
+        byte_budget (float): Target size of the encoded image in bytes, or None
+
+    Returns:
+        dict: JPEG bytes, pixel size, PDF colorspace and page size in points
+    """
+    with Image.open(path) as image:
+        page_size = (image.width * 72.0 / PAGE_DPI, image.height * 72.0 / PAGE_DPI)
+        scale = min(1.0,
+                    max_width / image.width if max_width else 1.0,
+                    max_height / image.height if max_height else 1.0)
+        passthrough = (image.format == "JPEG" and image.mode in ("L", "RGB")
+                       and scale == 1.0 and quality is None)
+        if passthrough:
+            with open(path, "rb") as f:
+                data = f.read()
+            passthrough = byte_budget is None or len(data) <= byte_budget
+        if passthrough:
+            size, mode = image.size, image.mode
+        else:
+            image = image.convert("L" if image.mode in ("1", "L", "LA", "I;16") else "RGB")
+            mode = image.mode
+            original = image
+            steps = [quality or 95]
+            if byte_budget:
+                steps += [q for q in QUALITY_STEPS if q < steps[0]]
+            for attempt in range(4):
+                size = (max(1, round(original.width * scale)),
+                        max(1, round(original.height * scale)))
+                image = original if size == original.size else original.resize(size, Image.LANCZOS)
+                for step in steps:
+                    data = encode_jpeg(image, step)
+                    if not byte_budget or len(data) <= byte_budget:
+                        break
+                if not byte_budget or len(data) <= byte_budget:
+                    break
+                scale *= 0.75
+
+    return {
+        "data": data,
+        "size": size,
+        "colorspace": "DeviceGray" if mode == "L" else "DeviceRGB",
+        "page_size": page_size,
+    }
+
+
+def prepared_images(paths, workers=None, **options):
+    """
+    Prepare images in a process pool and yield them in order.
+
+    At most a few images per worker are in flight so memory stays bounded
+    no matter how many slides there are.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(prepare_image, path, **options))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class StreamingPdfWriter:
+    """
+    Write a PDF one page at a time, embedding each JPEG unchanged.
+
+    Only byte offsets are kept in memory; the page tree, xref table and
+    trailer are written when the writer is closed.
+    """
+
+    def __init__(self, path, state=None):
+        self.path = path
+        if state:
+            # Continue a partial file from a state() snapshot, dropping anything written after it
+            self.file = open(path + ".tmp", "r+b")
+            self.file.truncate(state["size"])
+            self.file.seek(state["size"])
+            self.offsets = {obj_id: offset for obj_id, offset in state["offsets"]}
+            self.pages = list(state["pages"])
+            self.next_id = state["next_id"]
+        else:
+            self.file = open(path + ".tmp", "wb")
+            self.offsets = {}
+            self.pages = []
+            self.next_id = 3  # 1 and 2 are reserved for the catalog and page tree
+            self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def state(self):
+        """Snapshot of the partial file that a new writer can continue from."""
+        self.file.flush()
+        return {
+            "size": self.file.tell(),
+            "offsets": sorted(self.offsets.items()),
+            "pages": list(self.pages),
+            "next_id": self.next_id,
+        }
+
+    def write_object(self, obj_id, header, stream=None):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n{header}".encode("ascii"))
+        if stream is not None:
+            self.file.write(b"\nstream\n")
+            self.file.write(stream)
+            self.file.write(b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def add_page(self, image):
+        image_id, content_id, page_id = range(self.next_id, self.next_id + 3)
+        self.next_id += 3
+        width, height = image["size"]
+        page_width, page_height = image["page_size"]
+        self.write_object(
+            image_id,
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /{image['colorspace']} /BitsPerComponent 8 "
+            f"/Filter /DCTDecode /Length {len(image['data'])} >>",
+            image["data"])
+        content = f"q {page_width:.4f} 0 0 {page_height:.4f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self.write_object(content_id, f"<< /Length {len(content)} >>", content)
+        self.write_object(
+            page_id,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.4f} {page_height:.4f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>")
+        self.pages.append(page_id)
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.pages)
+        self.write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>")
+        self.write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.file.tell()
+        lines = [f"xref\n0 {self.next_id}\n", "0000000000 65535 f \n"]
+        lines += [f"{self.offsets[obj_id]:010d} 00000 n \n" for obj_id in range(1, self.next_id)]
+        lines.append(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self.file.write("".join(lines).encode("ascii"))
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.path + ".tmp")
+
+
+def describe_jpeg(data):
+    """Pixel size, PDF colorspace and page size of encoded JPEG bytes, in the form prepare_image returns."""
+    with Image.open(io.BytesIO(data)) as image:
+        return {
+            "data": data,
+            "size": image.size,
+            "colorspace": "DeviceGray" if image.mode == "L" else "DeviceRGB",
+            "page_size": (image.width * 72.0 / PAGE_DPI, image.height * 72.0 / PAGE_DPI),
+        }
+
+
+def add_slide(prs, data):
+    """Add a blank slide to prs showing the encoded image data full-slide."""
+    slide = prs.slides.add_slide(prs.slide_layouts[6])  # 6 is the layout code for a blank slide
+    slide.shapes.add_picture(io.BytesIO(data), Inches(0), Inches(0),
+                             width=prs.slide_width, height=prs.slide_height)
+
+
+def build_pptx(slides, pptx_output, errors, aborted):
+    try:
+        prs = Presentation()
+        while True:
+            data = slides.get()
+            if data is None:
+                break
+            add_slide(prs, data)
+        if aborted.is_set():
+            # Preparing the images failed; keep any earlier deck rather than save a truncated one
+            return
+        prs.save(pptx_output + ".tmp")
+        os.replace(pptx_output + ".tmp", pptx_output)
+    except Exception as exc:
+        errors.append(exc)
+        # Keep draining so the producer never blocks on a full queue
+        while slides.get() is not None:
+            pass
+
+
+def convert_images_to_pdf_pptx(input_folder, pdf_output, pptx_output, max_size=None,
+                               dpi=None, quality=None, size_budget=None, workers=None):
     """
-    Convert JPG images in a folder to PDF and PPTX files.
-    
+    Convert slide images in a folder to PDF and PPTX files.
+
+    Images are prepared in a process pool and each encoded copy feeds both
+    outputs: the PDF is streamed to disk page by page while a thread builds
+    the PowerPoint alongside it.
+
     Args:
-        input_folder (str): Path to folder containing JPG images
-        pdf_output (str): Output PDF filename
-        pptx_output (str): Output PPTX filename
+        input_folder (str): Path to folder containing JPG, PNG or WebP images
+        pdf_output (str): Output PDF filename, or None to skip the PDF
+        pptx_output (str): Output PPTX filename, or None to skip the PowerPoint
+        max_size (tuple): Maximum (width, height) in pixels, or None
+        dpi (int): Target resolution on a full-width slide, or None
+        quality (int): JPEG quality for recompression, or None to keep JPEGs as-is
+        size_budget (int): Target total image size per output in bytes, or None
+        workers (int): Processes preparing images, defaults to the CPU count
     """
-    
-    # Get all JPG files from input folder, sorted by name
-    image_files = sorted([f for f in os.listdir(input_folder) if f.lower().endswith('.jpg')])
-    
+
+    # Get all image files from input folder, sorted by name
+    image_files = sorted([f for f in os.listdir(input_folder) if f.lower().endswith(IMAGE_EXTENSIONS)])
+
     if not image_files:
-        print(f"No JPG images found in {input_folder}")
+        print(f"No images found in {input_folder}")
         return
-    
+
     print(f"Found {len(image_files)} images to process...")
-    
-    # Convert to PDF
-    print("Creating PDF...")
-    with open(pdf_output, "wb") as f:
-        # Create list of image paths with full paths
-        img_paths = [os.path.join(input_folder, img) for img in image_files]
-        # Convert to PDF
-        f.write(img2pdf.convert(img_paths))
-    
-    # Convert to PPTX
-    print("Creating PowerPoint...")
-    prs = Presentation()
-    
-    for img_file in image_files:
-        # Add a blank slide
-        blank_slide_layout = prs.slide_layouts[6]  # 6 is the layout code for a blank slide
-        slide = prs.slides.add_slide(blank_slide_layout)
-        
-        # Add picture to slide
-        img_path = os.path.join(input_folder, img_file)
-        left = top = Inches(0)  # Position at top-left corner
-        pic = slide.shapes.add_picture(img_path, left, top, width=prs.slide_width, height=prs.slide_height)
-    
-    # Save the PowerPoint
-    prs.save(pptx_output)
-    
-    print(f"Conversion complete! PDF saved as {pdf_output}, PowerPoint saved as {pptx_output}")
+
+    max_width, max_height = max_size or (None, None)
+    if dpi:
+        max_width = min(filter(None, (max_width, round(dpi * SLIDE_WIDTH_INCHES))))
+    options = {
+        "max_width": max_width,
+        "max_height": max_height,
+        "quality": quality,
+        "byte_budget": size_budget / len(image_files) if size_budget else None,
+    }
+
+    pdf = StreamingPdfWriter(pdf_output) if pdf_output else None
+    slides, errors, pptx_thread = None, [], None
+    aborted = threading.Event()
+    if pptx_output:
+        slides = queue.Queue(maxsize=8)
+        pptx_thread = threading.Thread(target=build_pptx, args=(slides, pptx_output, errors, aborted),
+                                       daemon=True)
+        pptx_thread.start()
+
+    try:
+        paths = [os.path.join(input_folder, img) for img in image_files]
+        for count, image in enumerate(prepared_images(paths, workers, **options), 1):
+            if pdf:
+                pdf.add_page(image)
+            if slides:
+                slides.put(image["data"])
+            if count % 100 == 0:
+                print(f"  {count}/{len(image_files)} images")
+    except BaseException:
+        aborted.set()
+        if pdf:
+            pdf.abort()
+        raise
+    finally:
+        if slides:
+            slides.put(None)
+            pptx_thread.join()
+
+    if pdf:
+        pdf.close()
+    if errors:
+        raise errors[0]
+
+    saved = [f"{name} saved as {output}" for name, output in (("PDF", pdf_output), ("PowerPoint", pptx_output)) if output]
+    print("Conversion complete! " + ", ".join(saved))
+
 
 if __name__ == "__main__":
-    # Input and output file paths
-    input_folder = "unique_slides"  # Folder containing JPG images
-    pdf_output = "unique_slides.pdf"       # Output PDF filename
-    pptx_output = "unique_slides.pptx"     # Output PPTX filename
-    
+    parser = argparse.ArgumentParser(description="Convert extracted slide images to PDF and PPTX.")
+    parser.add_argument("input_folder", nargs="?", default="unique_slides", help="Folder containing slide images")
+    parser.add_argument("--pdf", default="unique_slides.pdf", help="Output PDF filename ('' to skip)")
+    parser.add_argument("--pptx", default="unique_slides.pptx", help="Output PPTX filename ('' to skip)")
+    parser.add_argument("--max-size", type=int, nargs=2, metavar=("W", "H"), help="Downscale images to fit W x H pixels")
+    parser.add_argument("--dpi", type=int, help="Downscale images to this resolution on a full-width slide")
+    parser.add_argument("--quality", type=int, help="Recompress images as JPEG at this quality")
+    parser.add_argument("--size-budget", type=float, metavar="MB", help="Target total image size per output in megabytes")
+    parser.add_argument("--workers", type=int, help="Processes preparing images (default: CPU count)")
+    args = parser.parse_args()
+
     # Check if input folder exists
-    if not os.path.exists(input_folder):
-        print(f"Error: Input folder '{input_folder}' does not exist.")
+    if not os.path.exists(args.input_folder):
+        print(f"Error: Input folder '{args.input_folder}' does not exist.")
     else:
-        convert_images_to_pdf_pptx(input_folder, pdf_output, pptx_output)
+        convert_images_to_pdf_pptx(
+            args.input_folder, args.pdf or None, args.pptx or None,
+            max_size=args.max_size, dpi=args.dpi, quality=args.quality,
+            size_budget=int(args.size_budget * 1024 * 1024) if args.size_budget else None,
+            workers=args.workers)
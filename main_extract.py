@@ -1,59 +1,1356 @@
 import cv2
 import numpy as np
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
-from collections import deque
+import argparse
 import time
 import datetime
+import json
+import math
+import bisect
+import contextlib
+import io
 import sys
 import os
 import shutil
+import subprocess
+import queue
+import threading
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+def load_tkinter():
+    """Import tkinter on first use, so headless and batch runs never load it."""
+    global tk, ttk, filedialog, messagebox
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
 
 def hide_console():
     if sys.platform == 'win32':
         import ctypes
         ctypes.windll.user32.ShowWindow(ctypes.windll.kernel32.GetConsoleWindow(), 0)
 
+def probe_packets(video_path, ffprobe="ffprobe"):
+    """
+    List the video packets of a file with ffprobe, without decoding them.
+
+    Returns:
+        list: (pts_time, size, is_keyframe) tuples in presentation order
+    """
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "packet=pts_time,size,flags", "-of", "compact=p=0", str(video_path)],
+        capture_output=True, text=True, check=True)
+    packets = []
+    for line in result.stdout.splitlines():
+        fields = dict(field.split("=", 1) for field in line.split("|") if "=" in field)
+        try:
+            packets.append((float(fields["pts_time"]), int(fields["size"]), "K" in fields.get("flags", "")))
+        except (KeyError, ValueError):
+            # Packets without a timestamp (pts_time=N/A) can't be placed
+            continue
+    packets.sort()
+    return packets
+
+
+def candidate_frames(packets, fps, spike_ratio=3.0, window=30):
+    """
+    Pick frame indices worth decoding from packet metadata.
+
+    Keyframes are always candidates; other packets are when they are more
+    than spike_ratio times the median size of the last window inter-frame
+    packets, which is what a slide change looks like in a screen recording.
+    """
+    if not packets:
+        return []
+    origin = packets[0][0]
+    candidates = set()
+    recent = deque(maxlen=window)
+    for pts_time, size, is_keyframe in packets:
+        if is_keyframe or (len(recent) >= 5 and size > spike_ratio * np.median(recent)):
+            candidates.add(round((pts_time - origin) * fps))
+        if not is_keyframe:
+            recent.append(size)
+    return sorted(candidates)
+
+
+def largest_rectangle(mask):
+    """Return (row, col, height, width) of the largest all-True rectangle in a 2D bool array."""
+    rows, cols = mask.shape
+    heights = np.zeros(cols, dtype=int)
+    best = (0, 0, 0, 0)
+    for row in range(rows):
+        heights = np.where(mask[row], heights + 1, 0)
+        stack = []
+        for col in range(cols + 1):
+            height = heights[col] if col < cols else 0
+            start = col
+            while stack and stack[-1][1] >= height:
+                start, top = stack.pop()
+                if top * (col - start) > best[2] * best[3]:
+                    best = (row - top + 1, start, top, col - start)
+            stack.append((start, height))
+    return best
+
+
+def detect_slide_region(thumbnails, frame_size, motion=0.25, min_area=0.25):
+    """
+    Find the slide rectangle from a series of small gray thumbnails of one recording.
+
+    Cells that change between more than a motion fraction of consecutive
+    thumbnails belong to a webcam inset or other live video. The slide is
+    the largest rectangle of the remaining cells, less the rows and columns
+    along its edges that stay black (letterbox).
+
+    Returns:
+        tuple: (x, y, width, height) in frame pixels, or None when that is
+            (nearly) the whole frame or too small to be a slide
+    """
+    if len(thumbnails) < 3:
+        return None
+    stack = np.stack(thumbnails).astype(np.int16)
+    usable = (np.abs(np.diff(stack, axis=0)) > 12).mean(axis=0) <= motion
+    row, col, height, width = largest_rectangle(usable)
+    # Trim rows and columns along the rectangle's edges that stay black (letterbox)
+    dark = stack[:, row:row + height, col:col + width].max(axis=0) < 24
+    dark_rows, dark_cols = dark.all(axis=1), dark.all(axis=0)
+    while height and dark_rows[0]:
+        row, height, dark_rows = row + 1, height - 1, dark_rows[1:]
+    while height and dark_rows[-1]:
+        height, dark_rows = height - 1, dark_rows[:-1]
+    while width and dark_cols[0]:
+        col, width, dark_cols = col + 1, width - 1, dark_cols[1:]
+    while width and dark_cols[-1]:
+        width, dark_cols = width - 1, dark_cols[:-1]
+
+    rows, cols = usable.shape
+    area = height * width / (rows * cols)
+    if area >= 0.95 or area < min_area:
+        return None
+    frame_width, frame_height = frame_size
+    x, y = col * frame_width // cols, row * frame_height // rows
+    return (int(x), int(y), int((col + width) * frame_width // cols - x), int((row + height) * frame_height // rows - y))
+
+
+def same_region(a, b, frame_size, min_overlap=0.8):
+    """Whether two regions (None meaning the whole frame) overlap by at least min_overlap IoU."""
+    full = (0, 0, *frame_size)
+    ax, ay, aw, ah = a or full
+    bx, by, bw, bh = b or full
+    overlap_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    overlap_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = overlap_w * overlap_h
+    return intersection / (aw * ah + bw * bh - intersection) >= min_overlap
+
+
+class SlideRegionTracker:
+    """
+    Keep the slide rectangle of a recording up to date.
+
+    Every sample is shrunk to a 64x36 gray grid. Each recheck samples the
+    region is detected again from the recent ones; a different result
+    that shows up on two checks in a row is taken as a layout change and
+    replaces the current region.
+    """
+    grid = (64, 36)
+
+    def __init__(self, region=None, recheck=24):
+        self.region = region
+        self.recheck = recheck
+        self.recent = deque(maxlen=recheck)
+        self.pending = None
+        self.samples = 0
+
+    @classmethod
+    def shrink(cls, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, cls.grid, interpolation=cv2.INTER_AREA)
+
+    def observe(self, frame, frame_size=None):
+        """Feed a sample (possibly downscaled from frame_size); return True when the region changed."""
+        self.recent.append(self.shrink(frame))
+        self.samples += 1
+        if self.samples % self.recheck:
+            return False
+        frame_size = frame_size or frame.shape[1::-1]
+        region = detect_slide_region(list(self.recent), frame_size)
+        if same_region(region, self.region, frame_size):
+            self.pending = None
+            return False
+        if self.pending is None or not same_region(region, self.pending[0], frame_size):
+            self.pending = (region,)
+            return False
+        self.region, self.pending = region, None
+        return True
+
+
+class FingerprintStore:
+    """
+    Ring buffer of recently saved slides, kept as 256x256 grayscale fingerprints.
+
+    Each fingerprint is zero-mean and unit-norm, so the dot product of two of
+    them equals cv2.TM_CCOEFF_NORMED on the same thumbnails and the whole
+    history can be scored with a single matrix-vector product. A 32x32
+    grayscale thumbnail of every slide is kept alongside for the cascade's
+    tier 0 check.
+    """
+    size = (256, 256)
+    tiny_size = (32, 32)
+
+    def __init__(self, capacity=5):
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, self.size[0] * self.size[1]), dtype=np.float32)
+        self.tiny = np.zeros((capacity, self.tiny_size[0] * self.tiny_size[1]), dtype=np.float32)
+        # Frame index each slide was taken from, -1 when unknown
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.count = 0
+        self.next_slot = 0
+
+    @classmethod
+    def thumbnail(cls, frame):
+        small = cv2.resize(frame, cls.size)
+        return small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    @classmethod
+    def tiny_thumbnail(cls, frame):
+        # Plain bilinear sampling: a handful of pixel reads, unlike INTER_AREA
+        small = cv2.resize(frame, cls.tiny_size)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.reshape(-1).astype(np.float32)
+
+    @classmethod
+    def fingerprint(cls, frame):
+        return cls.from_thumbnail(cls.thumbnail(frame))
+
+    @staticmethod
+    def from_thumbnail(gray):
+        vector = gray.reshape(-1).astype(np.float32)
+        vector -= vector.mean()
+        norm = np.linalg.norm(vector)
+        # Flat frames (blank screens) stay all-zero, see best_match
+        if norm < 1e-6:
+            return np.zeros_like(vector)
+        return vector / norm
+
+    def __len__(self):
+        return self.count
+
+    def append(self, vector, tiny, frame_index=-1):
+        self.vectors[self.next_slot] = vector
+        self.tiny[self.next_slot] = tiny
+        self.ids[self.next_slot] = frame_index
+        self.next_slot = (self.next_slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def clear(self):
+        self.count = 0
+        self.next_slot = 0
+
+    def ordered(self):
+        """Return the stored (fingerprints, tiny thumbnails, frame indices) from oldest to newest."""
+        if self.count < self.capacity:
+            return self.vectors[:self.count].copy(), self.tiny[:self.count].copy(), self.ids[:self.count].copy()
+        return tuple(np.roll(array, -self.next_slot, axis=0) for array in (self.vectors, self.tiny, self.ids))
+
+    def frame_ids(self):
+        return set(self.ids[:self.count].tolist())
+
+    def replace(self, history):
+        self.clear()
+        for vector, tiny, frame_index in zip(*history):
+            self.append(vector, tiny, frame_index)
+
+    def min_tiny_diff(self, tiny):
+        """Smallest mean absolute difference (0-255) between tiny and a stored thumbnail."""
+        if not self.count:
+            return float("inf")
+        return float(np.abs(self.tiny[:self.count] - tiny).mean(axis=1).min())
+
+    @staticmethod
+    def similarity(vector, template):
+        """Pairwise version of best_match, with the same flat-template rule."""
+        return 1.0 if not template.any() else float(vector @ template)
+
+    def best_match(self, vector):
+        if not self.count:
+            return 0.0
+        # matchTemplate reports a perfect match whenever the template is flat
+        if not vector.any():
+            return 1.0
+        return float(np.max(self.vectors[:self.count] @ vector))
+
+
+class CascadeGate:
+    """
+    Thresholds and hit counters for the tiered duplicate check.
+
+    Tier 0 compares 32x32 thumbnails against the history by mean absolute
+    difference: at or below duplicate_diff the frame is a duplicate, at or
+    above new_diff it is new and tier 1 (the fingerprint correlation against
+    duplicate_threshold) is skipped. Tier 2, the ORB trained-model check
+    against trained_match_threshold, only runs for frames that would be saved.
+    """
+
+    def __init__(self, duplicate_diff=1.5, new_diff=40.0):
+        self.duplicate_diff = duplicate_diff
+        self.new_diff = new_diff
+        self.hits = dict.fromkeys((
+            "tier0_duplicate", "tier0_new", "tier1_duplicate", "tier1_new", "tier2_trained", "tier2_unique"), 0)
+
+    def check(self, diff, tiny):
+        """Return "duplicate", "new" or None when tier 0 can't decide."""
+        if diff <= self.duplicate_diff:
+            self.hits["tier0_duplicate"] += 1
+            return "duplicate"
+        # Flat frames are left to tier 1, which treats them as duplicates
+        if diff >= self.new_diff and tiny.std() >= 1:
+            self.hits["tier0_new"] += 1
+            return "new"
+        return None
+
+
+class DescriptorCache:
+    """
+    On-disk cache of ORB descriptors for the trainer folder.
+
+    All descriptors live in one uncompressed .npy file that is memory-mapped
+    on load, with a JSON index mapping each image to its slice. An entry is
+    reused only while the image's size and mtime and the ORB settings are
+    unchanged, so only new or edited images are recomputed.
+    """
+    image_suffixes = ('.jpg', '.jpeg', '.png', '.webp')
+
+    def __init__(self, folder, params):
+        self.folder = Path(folder)
+        self.params = params
+        self.index_path = self.folder / ".descriptor_cache.json"
+        self.data_path = self.folder / ".descriptor_cache.npy"
+
+    def _read(self):
+        try:
+            index = json.loads(self.index_path.read_text())
+            if index.get("params") != self.params:
+                return {}, None
+            return index["entries"], np.load(self.data_path, mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return {}, None
+
+    def _write(self, entries, arrays):
+        data = np.concatenate(arrays) if arrays else np.zeros((0, 32), dtype=np.uint8)
+        tmp_data = self.data_path.with_name(self.data_path.name + ".tmp")
+        tmp_index = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_data, "wb") as f:
+            np.save(f, data)
+        tmp_index.write_text(json.dumps({"params": self.params, "entries": entries}))
+        os.replace(tmp_data, self.data_path)
+        os.replace(tmp_index, self.index_path)
+
+    def load(self, compute):
+        """
+        Return descriptors for every trainer image, refreshing stale entries.
+
+        Args:
+            compute (callable): Maps a BGR image to descriptors or None
+
+        Returns:
+            list: (image name, descriptor array) pairs, sorted by name
+        """
+        cached, data = self._read()
+        entries = {}
+        results = []
+        changed = False
+
+        for img_path in sorted(self.folder.glob('*')):
+            if img_path.suffix.lower() not in self.image_suffixes:
+                continue
+            stat = img_path.stat()
+            entry = cached.get(img_path.name)
+            offset = None
+            if (data is not None and entry is not None and entry["size"] == stat.st_size
+                    and entry["mtime_ns"] == stat.st_mtime_ns):
+                offset = entry["offset"]
+                des = data[offset:offset + entry["count"]] if entry["count"] else None
+            else:
+                img = cv2.imread(str(img_path))
+                des = compute(img) if img is not None else None
+                changed = True
+            # Images without usable features are cached too, so they aren't retried every start
+            entries[img_path.name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                      "offset": offset, "count": 0 if des is None else len(des)}
+            if des is not None:
+                results.append((img_path.name, des))
+
+        if changed or data is None or set(entries) != set(cached):
+            offset = 0
+            for entry in entries.values():
+                entry["offset"] = offset
+                offset += entry["count"]
+            arrays = [np.array(des) for _, des in results]
+            # Drop every view of the old memory map before its file is replaced
+            results = data = None
+            self._write(entries, arrays)
+            data = np.load(self.data_path, mmap_mode='r')
+            results = [(name, data[entry["offset"]:entry["offset"] + entry["count"]])
+                       for name, entry in entries.items() if entry["count"]]
+        self.slices = [(entries[name]["offset"], entries[name]["count"]) for name, _ in results]
+        return results
+
+
+class TrainedModelIndex:
+    """
+    Single nearest-neighbour index over the descriptors of every trainer image.
+
+    Descriptors are stacked into one array with a parallel image-id array, and
+    each frame is matched with one kNN query. Every query descriptor votes
+    for the images among its neighbours that are as close as its best match
+    (within tolerance), so near-duplicate trainer images all get credit.
+    The shortlist of most-voted images is then scored exactly, as the share
+    of cross-checked matches within max_distance bits, so a score means the
+    same whether the trainer holds one image or thousands.
+    Large trainers use a FLANN LSH index; small ones an exact brute-force search.
+    """
+    lsh_min_descriptors = 20000
+
+    def __init__(self, descriptor_sets, k=4, max_distance=48, tolerance=8, shortlist=4):
+        self.k = k
+        self.max_distance = max_distance
+        self.tolerance = tolerance
+        self.shortlist = shortlist
+        self.counts = np.array([len(des) for des in descriptor_sets], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)))
+        self.matcher = None
+        self.lock = threading.Lock()
+        if not descriptor_sets:
+            return
+        self.descriptors = np.ascontiguousarray(np.concatenate(descriptor_sets))
+        self.image_ids = np.repeat(np.arange(len(descriptor_sets)), self.counts)
+        if len(self.descriptors) >= self.lsh_min_descriptors:
+            self.matcher = cv2.FlannBasedMatcher(
+                dict(algorithm=6, table_number=8, key_size=24, multi_probe_level=0),  # 6 = FLANN_INDEX_LSH
+                dict(checks=32))
+        else:
+            self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        self.matcher.add([self.descriptors])
+        self.matcher.train()
+
+    def __len__(self):
+        return len(self.counts)
+
+    def votes(self, frame_des):
+        """Number of query descriptors voting for every trainer image."""
+        votes = np.zeros(len(self.counts))
+        query_ids, train_ids, distances, best = [], [], [], []
+        with self.lock:
+            results = self.matcher.knnMatch(frame_des, k=self.k)
+        for query_id, neighbours in enumerate(results):
+            if not neighbours:
+                continue
+            for match in neighbours:
+                query_ids.append(query_id)
+                train_ids.append(match.trainIdx)
+                distances.append(match.distance)
+                best.append(neighbours[0].distance)
+        if query_ids:
+            distances, best = np.array(distances), np.array(best)
+            keep = (distances <= self.max_distance) & (distances <= best + self.tolerance)
+            images = self.image_ids[np.array(train_ids)[keep]]
+            # One vote per (query descriptor, image) pair
+            pairs = np.unique(np.array(query_ids)[keep] * len(self.counts) + images)
+            votes = np.bincount(pairs % len(self.counts), minlength=len(self.counts)).astype(float)
+        return votes
+
+    def scores(self, frame_des):
+        """
+        Return the share of matched descriptors for every trainer image.
+
+        Images outside the shortlist score 0.
+        """
+        scores = np.zeros(len(self.counts))
+        if self.matcher is None:
+            return scores
+        votes = self.votes(frame_des)
+        candidates = np.argsort(-votes, kind="stable")[:self.shortlist]
+        matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        for image in candidates[votes[candidates] > 0]:
+            trained_des = self.descriptors[self.offsets[image]:self.offsets[image + 1]]
+            matches = matcher.match(frame_des, trained_des)
+            close = sum(match.distance <= self.max_distance for match in matches)
+            scores[image] = close / min(len(frame_des), len(trained_des))
+        return scores
+
+
+class SlideIndex:
+    """
+    Near-duplicate index over 256-bit perceptual hashes of saved slides.
+
+    Multi-index hashing: each hash is cut into max_distance + 1 chunks, and
+    any hash within max_distance bits of a stored one agrees with it exactly
+    on at least one chunk. A lookup only compares the stored hashes that
+    share a chunk with the query, so it stays fast across thousands of
+    slides. Labels name where each slide came from ("<video path>:<frame>").
+    """
+    hash_size = 16
+
+    def __init__(self, max_distance=12):
+        self.max_distance = max_distance
+        edges = np.linspace(0, self.hash_size ** 2, max_distance + 2).astype(int)
+        self.chunks = list(zip(edges[:-1], edges[1:]))
+        self.tables = [{} for _ in self.chunks]
+        self.hashes = []
+        self.labels = []
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @classmethod
+    def hash(cls, frame):
+        """pHash: the lowest 16x16 DCT coefficients of a 64x64 gray thumbnail, thresholded at their median."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (cls.hash_size * 4, cls.hash_size * 4), interpolation=cv2.INTER_AREA)
+        coefficients = cv2.dct(small.astype(np.float32))[:cls.hash_size, :cls.hash_size]
+        return (coefficients > np.median(coefficients)).ravel()
+
+    def add(self, bits, label):
+        position = len(self.hashes)
+        self.hashes.append(np.packbits(bits))
+        self.labels.append(label)
+        for table, (start, end) in zip(self.tables, self.chunks):
+            table.setdefault(bits[start:end].tobytes(), []).append(position)
+
+    def find(self, bits):
+        """Return (label, distance) of the closest slide within max_distance bits, or None."""
+        candidates = set()
+        for table, (start, end) in zip(self.tables, self.chunks):
+            candidates.update(table.get(bits[start:end].tobytes(), ()))
+        if not candidates:
+            return None
+        positions = sorted(candidates)
+        packed = np.packbits(bits)
+        distances = np.unpackbits(np.stack([self.hashes[i] for i in positions]) ^ packed, axis=1).sum(axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        return self.labels[positions[best]], int(distances[best])
+
+    def state(self):
+        hashes = np.stack(self.hashes) if self.hashes else np.zeros((0, self.hash_size ** 2 // 8), dtype=np.uint8)
+        return hashes, np.array(self.labels, dtype=str)
+
+    @classmethod
+    def from_state(cls, hashes, labels, max_distance=12, skip_prefix=None):
+        index = cls(max_distance)
+        for packed, label in zip(hashes, labels):
+            label = str(label)
+            if skip_prefix is None or not label.startswith(skip_prefix):
+                index.add(np.unpackbits(packed).astype(bool), label)
+        return index
+
+    @classmethod
+    def load(cls, path, max_distance=12, skip_prefix=None):
+        """
+        Load a saved index, leaving out slides whose label starts with
+        skip_prefix (a string or a tuple of them); empty if path doesn't exist.
+        """
+        if not Path(path).exists():
+            return cls(max_distance)
+        with np.load(path) as data:
+            return cls.from_state(data["hashes"], data["labels"], max_distance, skip_prefix)
+
+    def save(self, path):
+        path = Path(path)
+        hashes, labels = self.state()
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, hashes=hashes, labels=labels)
+        os.replace(tmp_path, path)
+
+
+class PipeDecoder:
+    """
+    Decode every step-th frame with an ffmpeg subprocess, already scaled to
+    size and converted to 8-bit gray.
+
+    Raw frames are read from the pipe with readinto straight into a small
+    ring of preallocated buffers, so decoding allocates nothing per frame.
+    A yielded frame is only valid until `buffers` more frames were read.
+    """
+    def __init__(self, video_path, size, step=1, start_frame=0, ffmpeg="ffmpeg", buffers=3):
+        self.video_path = video_path
+        self.size = size
+        self.step = step
+        # Same positions as a full pass: multiples of step from start_frame on
+        self.first_frame = math.ceil(start_frame / step) * step
+        self.ffmpeg = ffmpeg
+        width, height = size
+        self.buffers = np.empty((buffers, height, width), dtype=np.uint8)
+
+    def command(self):
+        select = f"select=gte(n\\,{self.first_frame})*not(mod(n\\,{self.step}))"
+        return [
+            self.ffmpeg, "-nostdin", "-v", "error", "-i", str(self.video_path), "-an", "-sn",
+            "-vf", f"{select},scale={self.size[0]}:{self.size[1]}:flags=area,format=gray",
+            "-vsync", "0", "-f", "rawvideo", "-pix_fmt", "gray", "-",
+        ]
+
+    def frames(self):
+        """Yield (frame_index, gray frame) until the video ends."""
+        process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, bufsize=0)
+        try:
+            frame_index = self.first_frame
+            slot = 0
+            while True:
+                buffer = self.buffers[slot]
+                view = memoryview(buffer).cast("B")
+                filled = 0
+                while filled < len(view):
+                    read = process.stdout.readinto(view[filled:])
+                    if not read:
+                        if process.wait() != 0:
+                            raise RuntimeError(f"ffmpeg couldn't decode {self.video_path}")
+                        return
+                    filled += read
+                yield frame_index, buffer
+                frame_index += self.step
+                slot = (slot + 1) % len(self.buffers)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+
+class GrowingFile(io.BufferedIOBase):
+    """
+    Read-only view of a video that is still being written, for cv2.VideoCapture.
+
+    Reads past the current end wait for the writer instead of returning EOF,
+    so OpenCV decodes frames as the bytes arrive and never sees a half-written
+    packet. The writer counts as finished when finished() says so; otherwise
+    while <path>.part.json exists (see videodownloader.RangeDownload), or,
+    without that marker, once the file stopped growing for idle_timeout
+    seconds. stop() ends the wait early and reads then hit EOF.
+
+    The total size is unknown until the writer finishes, so containers that
+    keep their index at the end (MP4 without faststart, AVI) are only read
+    once the download is complete; MKV and fragmented MP4 stream.
+    """
+
+    def __init__(self, path, finished=None, stop=None, poll_interval=0.2, idle_timeout=30):
+        self.path = Path(path)
+        self.marker = Path(str(path) + ".part.json")
+        self.finished = finished
+        self.stop = stop or (lambda: False)
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.watch_marker = finished is None and self.marker.exists()
+        self.last_size = -1
+        self.last_growth = time.monotonic()
+        while not self.path.exists():
+            if self.writer_done() or self.stop():
+                raise FileNotFoundError(f"{self.path} never appeared")
+            time.sleep(poll_interval)
+        self.file = open(self.path, "rb")
+        self.position = 0
+        self.size = None
+
+    def writer_done(self):
+        if self.finished is not None:
+            return self.finished()
+        if self.watch_marker:
+            return not self.marker.exists()
+        return time.monotonic() - self.last_growth > self.idle_timeout
+
+    def available(self, needed):
+        """Bytes on disk, once there are at least needed or no more will come."""
+        while True:
+            if self.size is not None:
+                return self.size
+            # Checked before the size, so bytes written right before finishing are seen
+            done = self.writer_done() or self.stop()
+            size = os.fstat(self.file.fileno()).st_size
+            if size != self.last_size:
+                self.last_size = size
+                self.last_growth = time.monotonic()
+            if done:
+                self.size = size
+                return size
+            if size >= needed:
+                return size
+            time.sleep(self.poll_interval)
+
+    def read(self, size=-1):
+        end = self.available(self.position + size if size is not None and size >= 0 else float("inf"))
+        count = max(0, end - self.position if size is None or size < 0 else min(size, end - self.position))
+        self.file.seek(self.position)
+        data = self.file.read(count)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            if self.size is None:
+                # Unknown while the writer is busy; FFmpeg treats this as "size not available"
+                return -1
+            self.position = self.size + offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class SlideWriter:
+    """
+    Encode and write slides on a thread pool.
+
+    Supports JPEG and WebP at a given quality and PNG at a given compression
+    level, with an optional downscale so slides fit inside max_size
+    (width, height). At most max_pending slides wait in memory; write()
+    blocks beyond that. flush() and close() wait for every queued slide and
+    re-raise the first write error, or else the first sink error.
+
+    With export on, every slide is also encoded once as a JPEG (the slide
+    file itself when the format is jpg) and handed to the export sinks
+    (PdfExport, PptxExport) in the order write() and adopt() were called.
+    Without sinks that JPEG is written next to the slide instead, see
+    export_path_for; save_files=False skips the slide files. A sink whose
+    add() failed gets no further slides and is never finalized.
+    """
+    extensions = {"jpg": ".jpg", "jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+
+    def __init__(self, image_format="jpg", quality=100, png_compression=3, max_size=None,
+                 workers=2, max_pending=8, save_files=True, export=False, sinks=None, profiler=None):
+        if image_format.lower() not in self.extensions:
+            raise ValueError(f"Unsupported slide format: {image_format}")
+        self.extension = self.extensions[image_format.lower()]
+        if self.extension == ".jpg":
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        elif self.extension == ".webp":
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+        else:
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        self.export_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.max_size = max_size
+        self.save_files = save_files
+        self.export = export
+        self.sinks = sinks or []
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.Semaphore(max_pending)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.sequence = 0
+        self.delivered = 0
+        self.ready = {}
+        self.sink_lock = threading.Lock()
+        self.failed_sinks = []
+        self.sink_error = None
+        self.stats = {"slides": 0, "bytes": 0, "encode_seconds": 0.0}
+        self.profiler = profiler or StageProfiler()
+
+    def path_for(self, folder, name):
+        return Path(folder) / f"{name}{self.extension}"
+
+    def export_path_for(self, output_path):
+        """Where the export JPEG of a slide goes without sinks: the slide file itself if that is one."""
+        if self.save_files and self.extension == ".jpg":
+            return Path(output_path)
+        return Path(output_path).with_suffix(".export.jpg")
+
+    def _deliver(self, sequence, data):
+        # Slides finish out of order on the pool; sinks get them in submission order
+        if not self.sinks:
+            return
+        with self.sink_lock:
+            self.ready[sequence] = data
+            while self.delivered in self.ready:
+                data = self.ready.pop(self.delivered)
+                self.delivered += 1
+                if data is not None:
+                    with self.profiler.stage("export"):
+                        for sink in self.sinks:
+                            if sink in self.failed_sinks:
+                                continue
+                            try:
+                                sink.add(data)
+                            except Exception as e:
+                                self.failed_sinks.append(sink)
+                                self.sink_error = self.sink_error or e
+
+    def _encode_and_write(self, output_path, frame, sequence):
+        export = None
+        try:
+            start = time.perf_counter()
+            with self.profiler.stage("encode"):
+                if self.max_size:
+                    height, width = frame.shape[:2]
+                    scale = min(self.max_size[0] / width, self.max_size[1] / height)
+                    if scale < 1:
+                        frame = cv2.resize(frame, (round(width * scale), round(height * scale)),
+                                           interpolation=cv2.INTER_AREA)
+                encoded = None
+                if self.save_files:
+                    ok, encoded = cv2.imencode(self.extension, frame, self.params)
+                    if not ok:
+                        raise RuntimeError(f"Couldn't encode {output_path}")
+                if self.export:
+                    if encoded is not None and self.extension == ".jpg":
+                        export = encoded
+                    else:
+                        ok, export = cv2.imencode(".jpg", frame, self.export_params)
+                        if not ok:
+                            raise RuntimeError(f"Couldn't encode {output_path} for export")
+            encode_seconds = time.perf_counter() - start
+            with self.profiler.stage("write"):
+                if encoded is not None:
+                    with open(output_path, "wb") as f:
+                        f.write(encoded.tobytes())
+                if export is not None and export is not encoded and not self.sinks:
+                    with open(self.export_path_for(output_path), "wb") as f:
+                        f.write(export.tobytes())
+            with self.lock:
+                self.stats["slides"] += 1
+                self.stats["bytes"] += (len(encoded) if encoded is not None else 0) + \
+                    (len(export) if export is not None and export is not encoded else 0)
+                self.stats["encode_seconds"] += encode_seconds
+        finally:
+            try:
+                self._deliver(sequence, export.tobytes() if export is not None else None)
+            finally:
+                self.slots.release()
+
+    def _adopt(self, source_path, output_path, sequence):
+        data = None
+        try:
+            with self.profiler.stage("write"):
+                if self.save_files:
+                    os.replace(source_path, output_path)
+                if self.export:
+                    # Written by a writer with the same options but no sinks, see export_path_for
+                    shared = self.export_path_for(source_path) == Path(source_path)
+                    export_path = Path(output_path) if shared else self.export_path_for(source_path)
+                    with open(export_path, "rb") as f:
+                        data = f.read()
+                    if not shared:
+                        os.remove(export_path)
+        finally:
+            try:
+                self._deliver(sequence, data)
+            finally:
+                self.slots.release()
+
+    def write(self, output_path, frame):
+        self.slots.acquire()
+        self.futures.append(self.pool.submit(self._encode_and_write, output_path, frame, self.sequence))
+        self.sequence += 1
+
+    def adopt(self, source_path, output_path):
+        """Queue a slide already encoded by another writer: move it to output_path and export it."""
+        self.slots.acquire()
+        self.futures.append(self.pool.submit(self._adopt, source_path, output_path, self.sequence))
+        self.sequence += 1
+
+    def flush(self):
+        """Wait until every queued slide is on disk and with the sinks."""
+        for future in self.futures:
+            future.result()
+        self.futures = []
+        if self.sink_error is not None:
+            raise self.sink_error
+
+    def close(self, finalize=True):
+        """
+        Wait for every queued slide, then finish the sinks' documents, or
+        with finalize=False leave their partial files for a resumed run.
+        """
+        self.pool.shutdown(wait=True)
+        try:
+            self.flush()
+        finally:
+            for sink in self.sinks:
+                if sink in self.failed_sinks:
+                    # Leave the partial file as it is rather than finishing a document with slides missing
+                    with contextlib.suppress(Exception):
+                        sink.suspend()
+                elif finalize:
+                    sink.close()
+                else:
+                    sink.suspend()
+
+
+class PdfExport:
+    """
+    Append slides to a PDF as they are found, see converttofile.StreamingPdfWriter.
+
+    The document is written to <path>.tmp and moved into place by close();
+    state() snapshots the partial file so a resumed run can continue it.
+    """
+
+    def __init__(self, path, state=None):
+        from converttofile import StreamingPdfWriter, describe_jpeg
+        self.describe = describe_jpeg
+        self.writer = StreamingPdfWriter(str(path), state)
+        self.saved_state = None
+
+    @staticmethod
+    def partial_path(path):
+        return Path(str(path) + ".tmp")
+
+    def add(self, data):
+        self.writer.add_page(self.describe(data))
+
+    def state(self):
+        return self.saved_state if self.writer.file.closed else self.writer.state()
+
+    def suspend(self):
+        self.saved_state = self.writer.state()
+        self.writer.file.close()
+
+    def close(self):
+        self.writer.close()
+
+
+class PptxExport:
+    """
+    Collect slides for a PowerPoint, built by close().
+
+    The encoded images are appended to a spool file (<path>.spool) as they
+    arrive, so memory stays flat during extraction and a resumed run can
+    continue the spool; close() turns it into the deck.
+    """
+
+    def __init__(self, path, state=None):
+        self.path = Path(path)
+        spool = self.partial_path(path)
+        if state:
+            self.file = open(spool, "r+b")
+            self.file.truncate(state["size"])
+            self.file.seek(state["size"])
+            self.lengths = list(state["lengths"])
+        else:
+            self.file = open(spool, "wb")
+            self.lengths = []
+        self.saved_state = None
+
+    @staticmethod
+    def partial_path(path):
+        return Path(str(path) + ".spool")
+
+    def add(self, data):
+        self.file.write(data)
+        self.lengths.append(len(data))
+
+    def state(self):
+        if self.file.closed:
+            return self.saved_state
+        self.file.flush()
+        return {"size": self.file.tell(), "lengths": list(self.lengths)}
+
+    def suspend(self):
+        self.saved_state = self.state()
+        self.file.close()
+
+    def close(self):
+        from pptx import Presentation
+        from converttofile import add_slide
+        self.file.close()
+        prs = Presentation()
+        with open(self.partial_path(self.path), "rb") as f:
+            for length in self.lengths:
+                add_slide(prs, f.read(length))
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        prs.save(str(tmp_path))
+        os.replace(tmp_path, self.path)
+        self.partial_path(self.path).unlink()
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "--:--:--"
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+def peak_rss_mb(who="self"):
+    """Peak resident set size of this process (or of its finished children) in MB, None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+class StageProfiler:
+    """
+    Per-stage wall time, call counts and latency histograms for one run.
+
+    Wrap work in `with profiler.stage(name):` and count events with
+    count(). A disabled profiler hands out a shared no-op context manager
+    and ignores counts, so instrumentation costs one method call per stage.
+    """
+    bucket_ms = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000)
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NO_STAGE
+        return _StageTimer(self, name)
+
+    def record(self, name, seconds, calls=1, histogram=None):
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = {"calls": 0, "seconds": 0.0, "histogram": [0] * (len(self.bucket_ms) + 1)}
+            stats["calls"] += calls
+            stats["seconds"] += seconds
+            if histogram is None:
+                stats["histogram"][bisect.bisect_left(self.bucket_ms, seconds * 1000)] += 1
+            else:
+                stats["histogram"] = [a + b for a, b in zip(stats["histogram"], histogram)]
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        """Raw stage and counter totals, for merging into another process's profiler."""
+        with self.lock:
+            return {"stages": {name: dict(stats) for name, stats in self.stages.items()},
+                    "counters": dict(self.counters)}
+
+    def merge(self, snapshot):
+        for name, stats in snapshot["stages"].items():
+            self.record(name, stats["seconds"], stats["calls"], stats["histogram"])
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+
+    def report(self):
+        labels = [f"<={edge:g}" for edge in self.bucket_ms] + [f">{self.bucket_ms[-1]:g}"]
+        stages = {}
+        for name, stats in sorted(self.snapshot()["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            stages[name] = {
+                "calls": stats["calls"],
+                "seconds": round(stats["seconds"], 6),
+                "mean_ms": round(stats["seconds"] * 1000 / stats["calls"], 4) if stats["calls"] else 0.0,
+                "histogram_ms": dict(zip(labels, stats["histogram"])),
+            }
+        return {
+            "wall_seconds": round(time.perf_counter() - self.start, 6),
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb("children"),
+            "counters": dict(self.counters),
+            "stages": stages,
+        }
+
+
+class ProgressChannel:
+    """
+    Latest progress of a run, published at a bounded rate.
+
+    The processor publishes after every sample, but at most one snapshot per
+    min_interval seconds gets through, plus forced ones such as the final
+    state. Consumers either poll() the newest snapshot from their own thread,
+    the way the GUI does from the Tk loop, or register a callback, which
+    runs on the publishing thread.
+    """
+    def __init__(self, min_interval=0.25):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, callback=None):
+        self.callback = callback
+        self.total_frames = 0
+        self.start_frame = 0
+        self.start_time = time.monotonic()
+        self.next_publish = 0.0
+        self.latest = None
+        self.error = None
+
+    def publish(self, frame_count, counts, force=False):
+        now = time.monotonic()
+        if now < self.next_publish and not force:
+            return
+        self.next_publish = now + self.min_interval
+        elapsed = now - self.start_time
+        processed = frame_count - self.start_frame
+        fps = processed / elapsed if processed > 0 and elapsed > 0 else 0.0
+        self._deliver({
+            "frame": frame_count,
+            "total": self.total_frames,
+            "unique": counts["unique"],
+            "duplicate": counts["duplicate"],
+            "trained": counts["trained"],
+            "elapsed": elapsed,
+            "fps": fps,
+            "remaining": max(0, self.total_frames - frame_count) / fps if fps else None,
+            "message": None,
+        })
+
+    def fail(self, message):
+        self.error = message
+        self._deliver({"frame": 0, "total": self.total_frames, "unique": 0, "duplicate": 0, "trained": 0,
+                       "elapsed": time.monotonic() - self.start_time, "fps": 0.0, "remaining": None,
+                       "message": message})
+
+    def _deliver(self, snapshot):
+        with self.lock:
+            self.latest = snapshot
+        if self.callback:
+            self.callback(snapshot)
+
+    def poll(self):
+        """Return the snapshot published since the last poll, or None."""
+        with self.lock:
+            snapshot, self.latest = self.latest, None
+        return snapshot
+
+
+class Checkpoint:
+    """
+    Progress of an extraction, kept in <output folder>.checkpoint.npz.
+
+    Holds the next frame to sample, the verdict counts, the fingerprint
+    history, the SlideIndex and slide region if there are any, how far the
+    export documents got and whether sampling seeks, plus a signature of the
+    video and settings it belongs to. The file is replaced atomically, so a
+    crash leaves either the old or the new checkpoint behind.
+    """
+    def __init__(self, output_folder):
+        output_folder = Path(output_folder).resolve()
+        self.path = output_folder.with_name(output_folder.name + ".checkpoint.npz")
+
+    def save(self, next_frame, counts, history, signature, slide_index=None, region=None, exports=None,
+             seek_sampling=None):
+        vectors, tiny, ids = history.ordered()
+        meta = {"next_frame": next_frame, "counts": counts, "signature": signature, "region": region,
+                "exports": exports, "seek_sampling": seek_sampling}
+        arrays = {}
+        if slide_index is not None:
+            arrays["index_hashes"], arrays["index_labels"] = slide_index.state()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=vectors, tiny=tiny, ids=ids, meta=np.array(json.dumps(meta)), **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self, signature):
+        """
+        Return (next_frame, counts, history arrays, slide index arrays or
+        None, slide region or None, export sink states or None, whether
+        sampling seeks or None), or None if there is no usable checkpoint.
+        """
+        try:
+            with np.load(self.path) as data:
+                meta = json.loads(str(data["meta"]))
+                history = (data["vectors"], data["tiny"], data["ids"])
+                index_state = (data["index_hashes"], data["index_labels"]) if "index_hashes" in data else None
+        except (OSError, ValueError, KeyError) as e:
+            if self.path.exists():
+                print(f"Ignoring unreadable checkpoint {self.path}: {e}", file=sys.stderr)
+            return None
+        # Round-trip through JSON so tuples and lists compare equal
+        if meta["signature"] != json.loads(json.dumps(signature)):
+            print(f"Ignoring checkpoint {self.path}: it belongs to another video or other settings",
+                  file=sys.stderr)
+            return None
+        region = tuple(meta["region"]) if meta.get("region") else None
+        return (meta["next_frame"], meta["counts"], history, index_state, region, meta.get("exports"),
+                meta.get("seek_sampling"))
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
 class UltimateSlideProcessor:
-    def __init__(self, frame_skip=30, duplicate_threshold=0.98):
+    export_sinks = {"pdf": PdfExport, "pptx": PptxExport}
+
+    def __init__(self, frame_skip=30, duplicate_threshold=0.98, sample_interval=None, history_size=5,
+                 pipeline_workers=0, segment_workers=0, cascade=None, adaptive_interval=None,
+                 settle_seconds=0.5, keyframe_scan=False, writer_options=None, checkpoint_seconds=30,
+                 resume=False, progress_interval=0.25, profile=False, report_path=None,
+                 global_index=False, index_distance=12, index_path=None, roi=False, save_roi_crop=False,
+                 pipe_decoder=False, exports=None, stream=False, stream_finished=None, video_path=None,
+                 output_folder=None, trainer_folder=None):
         # Get correct directory (works for both .exe and script)
         self.current_dir = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
-        self.video_path = self.current_dir / "video.mp4"
-        self.output_folder = self.current_dir / "unique_slides"
-        self.trainer_folder = self.current_dir / "trainer"
-        
-        # Create folders if they don't exist
-        self.output_folder.mkdir(exist_ok=True)
-        self.trainer_folder.mkdir(exist_ok=True)
+        self.video_path = Path(video_path) if video_path else self.current_dir / "video.mp4"
+        self.output_folder = Path(output_folder) if output_folder else self.current_dir / "unique_slides"
+        self.trainer_folder = Path(trainer_folder) if trainer_folder else self.current_dir / "trainer"
         
         # Initialize OpenCV objects
-        self.orb = cv2.ORB_create(nfeatures=2000, fastThreshold=5)
-        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        self.orb_params = {"nfeatures": 2000, "fastThreshold": 5}
+        self.orb = cv2.ORB_create(**self.orb_params)
+        self._local = threading.local()
+        # Share of close cross-checked ORB matches; slides that only share a layout score about 0.3
+        self.trained_match_threshold = 0.4
         self.duplicate_threshold = duplicate_threshold
         self.min_keypoints = 50
-        self.frame_history = deque(maxlen=5)
+        self.feature_size = (800, 600)
+        self.frame_history = FingerprintStore(capacity=history_size)
         self.frame_skip = frame_skip
+        # Optional sampling period in seconds; overrides frame_skip when set
+        self.sample_interval = sample_interval
+        # Coarse grid in seconds for transition search by bisection; overrides both of the above
+        self.adaptive_interval = adaptive_interval
+        self.settle_seconds = settle_seconds
+        # Decode only keyframes and packet-size spikes found by ffprobe; overrides the modes above
+        self.keyframe_scan = keyframe_scan
+        self.ffprobe = shutil.which("ffprobe")
+        # Decode small gray analysis frames with ffmpeg, see PipeDecoder; slides are fetched at full size by seeking
+        self.pipe_decoder = pipe_decoder
+        self.ffmpeg = shutil.which("ffmpeg")
+        # Read video_path while it is still being downloaded or written, see GrowingFile;
+        # stream_finished optionally tells when the writer is done
+        self.stream = stream
+        self.stream_finished = stream_finished
+        self.stream_sources = []
+        self.frame_size = None
+        self.fps = 0.0
+        self._candidates = None
+        self._seek_sampling = None
+        # SlideWriter settings (format, quality, max_size, ...); stats of the last run end up in write_stats
+        self.writer_options = writer_options or {}
+        self.write_stats = None
+        # Where unique slides go as they are found: "folder" (slide files in output_folder),
+        # "pdf" and "pptx" (<output folder>.pdf / .pptx, finished when extraction ends)
+        self.exports = list(exports or ["folder"])
+        for kind in self.exports:
+            if kind not in self.export_sinks and kind != "folder":
+                raise ValueError(f"Unsupported export: {kind}")
+        self.export_state = None
+        # Analysis threads for the pipelined path; 0 or 1 keeps everything on one thread
+        self.pipeline_workers = pipeline_workers
+        # Processes for segment-parallel extraction; takes precedence over the pipeline
+        self.segment_workers = segment_workers
+        # Optional CascadeGate for settling obvious frames from tiny thumbnails
+        self.cascade = cascade
+        # Check unique frames against every slide saved so far (and in earlier runs,
+        # when index_path is set), not just the recent history; see SlideIndex
+        self.index_path = Path(index_path) if index_path else None
+        self.global_index = global_index or self.index_path is not None
+        self.index_distance = index_distance
+        self.slide_index = None
+        # Compare only the slide rectangle (x, y, w, h), detected when roi is on; None is the whole frame
+        self.roi = roi
+        self.save_roi_crop = save_roi_crop
+        self.region = None
+        self.region_tracker = None
+        # Seconds between checkpoints (None disables them); resume continues from the last one
+        self.checkpoint_seconds = checkpoint_seconds
+        self.resume = resume
+        # Rate-limited progress snapshots, see ProgressChannel
+        self.progress = ProgressChannel(progress_interval)
+        # Per-stage timings, off unless profile is set; the JSON report defaults to <output folder>.report.json
+        self.profiler = StageProfiler(profile)
+        self.report_path = report_path
         self.should_stop = False
+        self.counts = None
         
-        # Load trained images
+        # Trained images are loaded on the first run, or handed over with set_trained_descriptors
         self.trained_descriptors = []
-        self.load_trained_model()
+        self.trained_index = None
+        self.trained_source = None
 
     def load_trained_model(self):
-        self.trained_descriptors = []
-        for img_path in self.trainer_folder.glob('*'):
-            if img_path.suffix.lower() in ('.jpg', '.jpeg', '.png'):
-                img = cv2.imread(str(img_path))
-                if img is not None:
-                    des = self.extract_features(img)
+        cache = DescriptorCache(self.trainer_folder, {
+            **self.orb_params,
+            "feature_size": list(self.feature_size),
+            "min_keypoints": self.min_keypoints,
+        })
+        try:
+            trained = cache.load(self.extract_features)
+            # Other processes can map the same cache file instead of receiving copies
+            self.trained_source = (str(cache.data_path), cache.slices)
+        except OSError:
+            # Read-only trainer folder: fall back to computing in memory
+            trained = []
+            for img_path in sorted(self.trainer_folder.glob('*')):
+                if img_path.suffix.lower() in DescriptorCache.image_suffixes:
+                    img = cv2.imread(str(img_path))
+                    des = self.extract_features(img) if img is not None else None
                     if des is not None:
-                        self.trained_descriptors.append(des)
+                        trained.append((img_path.name, des))
+            self.trained_source = [des for _, des in trained]
+        self.set_trained_descriptors([des for _, des in trained])
+
+    def set_trained_descriptors(self, descriptors):
+        self.trained_descriptors = descriptors
+        self.trained_index = TrainedModelIndex(descriptors)
+
+    def use_trained_source(self, source):
+        """Load descriptors shared by another process, see load_trained_model."""
+        if isinstance(source, tuple):
+            data_path, slices = source
+            data = np.load(data_path, mmap_mode='r') if slices else None
+            source = [data[offset:offset + count] for offset, count in slices]
+        self.trained_source = source
+        self.set_trained_descriptors(source)
+
+    def prepare(self):
+        """Create the working folders and load the trainer, unless that already happened."""
+        if "folder" in self.exports:
+            self.output_folder.mkdir(parents=True, exist_ok=True)
+        if self.trained_index is None:
+            self.trainer_folder.mkdir(parents=True, exist_ok=True)
+            self.load_trained_model()
 
     def extract_features(self, image):
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.resize(gray, (800, 600))
-        kp, des = self.orb.detectAndCompute(gray, None)
+        # ORB objects aren't safe to share, so pipeline workers get their own
+        orb = self.orb if threading.current_thread() is threading.main_thread() else getattr(self._local, 'orb', None)
+        if orb is None:
+            orb = self._local.orb = cv2.ORB_create(**self.orb_params)
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, self.feature_size)
+        kp, des = orb.detectAndCompute(gray, None)
         return des if des is not None and len(des) >= self.min_keypoints else None
 
     def calculate_similarity(self, frame1, frame2):
@@ -64,93 +1361,1179 @@ class UltimateSlideProcessor:
         gray2 = cv2.cvtColor(frame2_small, cv2.COLOR_BGR2GRAY)
         return cv2.matchTemplate(gray1, gray2, cv2.TM_CCOEFF_NORMED)[0][0]
 
-    def is_duplicate(self, frame):
-        return any(
-            self.calculate_similarity(prev_frame, frame) >= self.duplicate_threshold
-            for prev_frame in self.frame_history
-        )
+    def is_duplicate(self, frame, fingerprint=None):
+        if fingerprint is None:
+            with self.profiler.stage("fingerprint"):
+                fingerprint = self.frame_history.fingerprint(frame)
+        with self.profiler.stage("similarity"):
+            return self.frame_history.best_match(fingerprint) >= self.duplicate_threshold
+
+    def classify(self, frame, fingerprint=None, trained_match=None, tiny=None):
+        """
+        Return "duplicate", "trained" or "unique" for a sampled frame.
+
+        With a cascade configured, tier 0 may settle the frame from its tiny
+        thumbnail before any fingerprint is computed. frame may be None when
+        every feature it would be needed for is passed in.
+        """
+        cascade = self.cascade
+        tier0 = None
+        if cascade:
+            with self.profiler.stage("cascade"):
+                if tiny is None:
+                    tiny = FingerprintStore.tiny_thumbnail(frame)
+                tier0 = cascade.check(self.frame_history.min_tiny_diff(tiny), tiny)
+            if tier0 == "duplicate":
+                return "duplicate"
+        if tier0 is None:
+            if self.is_duplicate(frame, fingerprint):
+                if cascade:
+                    cascade.hits["tier1_duplicate"] += 1
+                return "duplicate"
+            if cascade:
+                cascade.hits["tier1_new"] += 1
+        if self.slide_index is not None:
+            with self.profiler.stage("index"):
+                seen = self.slide_index.find(SlideIndex.hash(frame))
+            if seen is not None:
+                return "duplicate"
+        if trained_match if trained_match is not None else self.matches_trained_model(frame):
+            if cascade:
+                cascade.hits["tier2_trained"] += 1
+            return "trained"
+        if cascade:
+            cascade.hits["tier2_unique"] += 1
+        return "unique"
+
+    def remember(self, frame, fingerprint=None, tiny=None, frame_index=-1):
+        """Add a saved slide to the history."""
+        if fingerprint is None:
+            fingerprint = FingerprintStore.fingerprint(frame)
+        if tiny is None:
+            tiny = FingerprintStore.tiny_thumbnail(frame)
+        self.frame_history.append(fingerprint, tiny, frame_index)
+        if self.slide_index is not None:
+            self.slide_index.add(SlideIndex.hash(frame), self.index_label(frame_index))
+
+    def index_label(self, frame_index=""):
+        """Global index label of a slide; without frame_index, the prefix all slides of this video share."""
+        # The full path, not the name: each course folder may hold its own video.mp4
+        return f"{self.video_path.resolve()}:{frame_index}"
 
     def matches_trained_model(self, frame):
         if not self.trained_descriptors:
             return False
             
-        frame_des = self.extract_features(frame)
+        with self.profiler.stage("orb"):
+            frame_des = self.extract_features(frame)
         if frame_des is None:
             return False
-            
-        for trained_des in self.trained_descriptors:
-            try:
-                matches = self.matcher.match(frame_des, trained_des)
-                similarity = len(matches) / min(len(frame_des), len(trained_des))
-                if similarity >= 0.25:
-                    return True
-            except:
-                continue
-        return False
+
+        try:
+            with self.profiler.stage("match"):
+                scores = self.trained_index.scores(frame_des)
+        except cv2.error as e:
+            print(f"Trained model matching failed: {e}", file=sys.stderr)
+            return False
+        return bool(scores.max() >= self.trained_match_threshold)
+
+    def crop(self, frame):
+        if self.region is None or frame is None:
+            return frame
+        x, y, width, height = self.region
+        full_width, full_height = self.frame_size or frame.shape[1::-1]
+        if frame.shape[1] != full_width or frame.shape[0] != full_height:
+            # Downscaled analysis frame from the pipe decoder
+            sx, sy = frame.shape[1] / full_width, frame.shape[0] / full_height
+            x, y, width, height = round(x * sx), round(y * sy), round(width * sx), round(height * sy)
+        return frame[y:y + height, x:x + width]
+
+    def slide_image(self, frame):
+        """What gets saved for a unique frame: the whole frame, or just the slide with save_roi_crop."""
+        return self.crop(frame) if self.save_roi_crop else frame
+
+    def open_capture(self):
+        """A VideoCapture for video_path; in stream mode it reads through a GrowingFile."""
+        if not self.stream:
+            return cv2.VideoCapture(str(self.video_path))
+        source = GrowingFile(self.video_path, self.stream_finished, stop=lambda: self.should_stop)
+        # cap.release() crashes OpenCV if it drops the last reference to a Python source, so hold one here
+        self.stream_sources.append(source)
+        return cv2.VideoCapture(source, cv2.CAP_FFMPEG, [])
+
+    def probe_region(self, start_frame=0, count=24, spacing_seconds=0.5):
+        """Detect the slide region from count frames spacing_seconds apart, from start_frame on."""
+        cap = self.open_capture()
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        step = max(1, round(spacing_seconds * fps)) if fps > 0 else 15
+        thumbnails = []
+        frame_size = None
+        try:
+            if start_frame:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            offset = 0
+            while len(thumbnails) < count and cap.grab():
+                if offset % step == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    thumbnails.append(SlideRegionTracker.shrink(frame))
+                    frame_size = frame.shape[1::-1]
+                offset += 1
+        finally:
+            cap.release()
+        return detect_slide_region(thumbnails, frame_size) if thumbnails else None
 
     def stop_processing(self):
         self.should_stop = True
-    
-    def process_video(self, progress_callback=None):
-        if not self.video_path.exists():
-            if progress_callback:
-                progress_callback(0, 1, 0, 0, 0, "video.mp4 not found!")
-            return False
 
-        cap = cv2.VideoCapture(str(self.video_path))
-        if not cap.isOpened():
-            if progress_callback:
-                progress_callback(0, 1, 0, 0, 0, "Couldn't open video file!")
-            return False
+    def restrict_to_streaming(self):
+        """Turn off the modes that need the whole file up front; frames are then read strictly in order."""
+        disabled = []
+        if self.segment_workers > 1:
+            disabled.append("segments")
+            self.segment_workers = 0
+        if self.pipe_decoder:
+            disabled.append("the ffmpeg pipe decoder")
+            self.pipe_decoder = False
+        if self.keyframe_scan:
+            disabled.append("the keyframe scan")
+            self.keyframe_scan = False
+        if self.adaptive_interval:
+            disabled.append("adaptive sampling")
+            self.adaptive_interval = None
+        if disabled:
+            print(f"Stream mode reads the video in order, running without {', '.join(disabled)}", file=sys.stderr)
 
+    def supports_cheap_seeking(self, cap, frames_per_sample, probe_frames=48):
+        """
+        Whether seeking from sample to sample beats grabbing the frames in between.
+
+        Two probe seeks into the video must land where asked, and on average
+        take less time than grabbing frames_per_sample frames, estimated from
+        grabbing probe_frames after the second one. With long keyframe
+        intervals every seek decodes from the previous keyframe, so this
+        settles on grabbing unless the samples are keyframe intervals apart.
+        """
+        fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        saved_count = duplicates = trained_matches = frame_count = 0
-        self.should_stop = False
-        self.start_time = time.time()
+        if fps <= 0 or total_frames <= probe_frames * 2:
+            return False
+        try:
+            seek_seconds = 0.0
+            for target_frame in (total_frames // 3, total_frames * 2 // 3 - probe_frames):
+                target_msec = target_frame / fps * 1000
+                start = time.perf_counter()
+                if not cap.set(cv2.CAP_PROP_POS_MSEC, target_msec) or not cap.grab():
+                    return False
+                seek_seconds += (time.perf_counter() - start) / 2
+                if abs(cap.get(cv2.CAP_PROP_POS_MSEC) - target_msec) > 2 * 1000 / fps:
+                    return False
+            start = time.perf_counter()
+            for _ in range(probe_frames):
+                if not cap.grab():
+                    return False
+            grab_seconds = (time.perf_counter() - start) / probe_frames * frames_per_sample
+            return seek_seconds < grab_seconds
+        finally:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
-        while not self.should_stop:
-            ret, frame = cap.read()
+    def seeks_samples(self, cap, fps):
+        """
+        Whether sample_interval sampling seeks instead of grabbing, decided
+        once per video: the probe is timed, so asking again could disagree
+        with the segments or the checkpoint of the same run.
+        """
+        if self._seek_sampling is None or self._seek_sampling[0] != self.video_path:
+            # The seek probe jumps to the middle of the video, which a growing file doesn't have yet
+            cheap = fps > 0 and not self.stream and self.supports_cheap_seeking(cap, self.sample_interval * fps)
+            self._seek_sampling = (self.video_path, bool(cheap))
+        return self._seek_sampling[1]
+
+    def sample_frames(self, cap, start_frame=0, end_frame=None):
+        """
+        Yield (frame_index, frame) for every frame that should be analyzed.
+
+        Skipped frames are only grabbed, never decoded into an image. When
+        sample_interval is set and the container seeks reliably and faster
+        than grabbing a sample interval's worth of frames, the video is
+        sampled by timestamp instead of walking every frame, and with
+        adaptive_interval set only the frames right after each transition are
+        produced (see _sample_adaptively). keyframe_scan decodes only the
+        frames ffprobe's packet metadata points at. start_frame and
+        end_frame restrict sampling to a range while keeping the same sample
+        positions a full pass would use.
+        """
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if self.keyframe_scan and fps > 0:
+            candidates = self.packet_candidates(fps)
+            if candidates is not None:
+                yield from self._sample_candidates(cap, candidates, start_frame, end_frame)
+                return
+        if self.adaptive_interval and fps > 0:
+            yield from self._sample_adaptively(cap, fps, start_frame, end_frame)
+            return
+        step = self.frame_skip
+        if self.sample_interval:
+            if self.seeks_samples(cap, fps):
+                yield from self._sample_by_seeking(cap, fps, start_frame, end_frame)
+                return
+            step = max(1, round(self.sample_interval * fps)) if fps > 0 else self.frame_skip
+
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frame_index = start_frame
+        profiler = self.profiler
+        while not self.should_stop and (end_frame is None or frame_index < end_frame):
+            with profiler.stage("grab"):
+                grabbed = cap.grab()
+            if not grabbed:
+                break
+            profiler.count("frames_decoded")
+            if frame_index % step == 0:
+                with profiler.stage("retrieve"):
+                    ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                yield frame_index, frame
+            frame_index += 1
+
+    def _sample_by_seeking(self, cap, fps, start_frame=0, end_frame=None):
+        frames_per_sample = self.sample_interval * fps
+        # Half-frame slack so a sample's own (rounded) frame index maps back to it
+        sample = math.ceil((start_frame - 0.5) / frames_per_sample)
+        while not self.should_stop and (end_frame is None or sample * frames_per_sample + 0.5 < end_frame):
+            with self.profiler.stage("seek"):
+                cap.set(cv2.CAP_PROP_POS_MSEC, sample * self.sample_interval * 1000)
+                frame_index = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+                ret, frame = cap.read()
+            self.profiler.count("frames_decoded")
             if not ret:
                 break
+            yield frame_index, frame
+            sample += 1
 
-            if frame_count % self.frame_skip == 0:
-                if self.is_duplicate(frame):
-                    duplicates += 1
-                elif self.matches_trained_model(frame):
-                    trained_matches += 1
-                else:
-                    output_path = self.output_folder / f"slide_{saved_count:05d}.jpg"
-                    cv2.imwrite(str(output_path), frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
-                    saved_count += 1
-                    self.frame_history.append(frame.copy())
-
-            frame_count += 1
-            if progress_callback:
-                # Calculate timing metrics
-                current_time = time.time()
-                elapsed_seconds = current_time - self.start_time
-                elapsed_str = str(datetime.timedelta(seconds=int(elapsed_seconds)))
-                
-                # Calculate remaining time
-                if frame_count > 0 and elapsed_seconds > 0:
-                    frames_per_second = frame_count / elapsed_seconds
-                    remaining_seconds = (total_frames - frame_count) / frames_per_second
-                    remaining_str = str(datetime.timedelta(seconds=int(remaining_seconds)))
-                    speed_str = f"{frames_per_second:.1f} fps"
+    def packet_candidates(self, fps):
+        """Candidate frame indices from packet metadata, or None if ffprobe can't provide them."""
+        if self._candidates is not None and self._candidates[0] == self.video_path:
+            return self._candidates[1]
+        if not self.ffprobe:
+            print("ffprobe not found, keyframe scan falls back to regular sampling", file=sys.stderr)
+            return None
+        try:
+            candidates = candidate_frames(probe_packets(self.video_path, self.ffprobe), fps)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Packet scan failed, falling back to regular sampling: {e}", file=sys.stderr)
+            return None
+        self._candidates = (self.video_path, candidates)
+        return candidates
+
+    def _sample_candidates(self, cap, candidates, start_frame=0, end_frame=None):
+        for frame_index in candidates:
+            if self.should_stop or (end_frame is not None and frame_index >= end_frame):
+                break
+            if frame_index < start_frame:
+                continue
+            try:
+                frame = self.read_frame(cap, frame_index)
+            except RuntimeError:
+                break
+            yield frame_index, frame
+
+    def _sample_adaptively(self, cap, fps, start_frame=0, end_frame=None):
+        """
+        Yield the first frame and the settled frame after every slide transition.
+
+        Frames are compared on a coarse adaptive_interval grid. When two
+        neighbouring grid frames fail the similarity test, the interval is
+        bisected with seeks down to the first changed frame, and the frame
+        settle_seconds later (capped at the grid frame) is yielded; the search
+        then continues from there in case the interval holds more than one
+        change. Each grid interval is searched on its own, so a frame range
+        yields exactly what a full pass yields inside it (the interval around
+        start_frame is searched again, keeping only frames from start_frame).
+        """
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        end_frame = total_frames if end_frame is None else min(end_frame, total_frames)
+        step = max(1, round(self.adaptive_interval * fps))
+        settle = max(1, round(self.settle_seconds * fps))
+        probes = {}
+
+        def probe(frame_index):
+            if frame_index not in probes:
+                try:
+                    frame = self.read_frame(cap, frame_index)
+                except RuntimeError:
+                    return None, None
+                with self.profiler.stage("fingerprint"):
+                    probes[frame_index] = (frame, FingerprintStore.fingerprint(self.crop(frame)))
+            return probes[frame_index]
+
+        def unchanged(a, b):
+            return FingerprintStore.similarity(probe(a)[1], probe(b)[1]) >= self.duplicate_threshold
+
+        left = start_frame // step * step
+        if start_frame == 0 < end_frame:
+            frame, _ = probe(0)
+            if frame is None:
+                return
+            yield 0, frame
+        while not self.should_stop and left < end_frame:
+            right = min(left + step, total_frames - 1)
+            if right <= left or probe(left)[0] is None or probe(right)[0] is None:
+                break
+            position = left
+            while not self.should_stop and not unchanged(position, right):
+                low, high = position, right
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if probe(middle)[0] is None:
+                        return
+                    if unchanged(position, middle):
+                        low = middle
+                    else:
+                        high = middle
+                settled = min(high + settle, right)
+                if settled >= end_frame or probe(settled)[0] is None:
+                    return
+                if settled >= start_frame:
+                    yield settled, probe(settled)[0]
+                position = settled
+            left += step
+            # Only the new left edge can be reused by the next interval
+            probes = {left: probes[left]} if left in probes else {}
+
+    def pipe_step(self, fps):
+        """Frame step the ffmpeg pipe decoder samples at, or None when this run decodes with OpenCV."""
+        if not self.pipe_decoder or not self.ffmpeg or self.keyframe_scan or self.adaptive_interval:
+            return None
+        if self.segment_workers > 1 and not self.global_index:
+            return None  # Segment workers decode with OpenCV
+        if self.sample_interval and fps > 0:
+            return max(1, round(self.sample_interval * fps))
+        return self.frame_skip
+
+    def piped_samples(self, cap, start_frame=0):
+        """
+        Yield (frame_index, gray frame, None, None, None) from a PipeDecoder,
+        or return None when the sampling mode or environment needs OpenCV.
+
+        Frames come at feature_size when there is a trainer to match
+        against, otherwise at the fingerprint size; with roi the aspect
+        ratio is kept and both sides are doubled, so a crop is still big
+        enough.
+        """
+        if not self.ffmpeg:
+            print("ffmpeg not found, decoding with OpenCV", file=sys.stderr)
+            return None
+        if self.keyframe_scan or self.adaptive_interval:
+            print("Keyframe and adaptive sampling seek, decoding with OpenCV", file=sys.stderr)
+            return None
+        step = self.pipe_step(cap.get(cv2.CAP_PROP_FPS))
+        size = self.feature_size if self.trained_descriptors else FingerprintStore.size
+        if self.roi:
+            # The slide may cover only half the frame either way and still needs size pixels after cropping
+            width, height = self.frame_size
+            scale = min(1.0, max(2 * size[0] / width, 2 * size[1] / height))
+            size = (round(width * scale / 2) * 2, round(height * scale / 2) * 2)
+        decoder = PipeDecoder(self.video_path, size, step, start_frame, self.ffmpeg)
+
+        def samples():
+            frames = decoder.frames()
+            try:
+                while not self.should_stop:
+                    with self.profiler.stage("pipe"):
+                        item = next(frames, None)
+                    if item is None:
+                        break
+                    yield (*item, None, None, None)
+            finally:
+                frames.close()
+        return samples()
+
+    def analyze_sample(self, frame, history):
+        """
+        Precompute what the ordered stage needs to classify a frame.
+
+        The trained-model check is only run speculatively when the frame isn't
+        a duplicate of the history snapshot the worker sees; the ordered stage
+        always re-checks duplicates against the real history, so a stale
+        snapshot can cost extra work but never changes the result. The slide
+        region used is returned too, so results for a stale crop are dropped.
+        """
+        region = self.region
+        if region is not None:
+            x, y, width, height = region
+            frame = frame[y:y + height, x:x + width]
+        with self.profiler.stage("fingerprint"):
+            fingerprint = FingerprintStore.fingerprint(frame)
+        trained_match = None
+        with self.profiler.stage("similarity"):
+            is_new = history.best_match(fingerprint) < self.duplicate_threshold
+        if is_new:
+            trained_match = self.matches_trained_model(frame)
+        return fingerprint, trained_match, region
+
+    def pipelined_samples(self, cap, workers, start_frame=0):
+        """
+        Yield (frame_index, frame, fingerprint, trained_match, region) in decode order.
+
+        A decoder thread feeds a bounded queue and a thread pool analyzes
+        samples ahead of the consumer. At most a few samples per worker are in
+        flight, so memory stays bounded however far decoding could run ahead.
+        """
+        frames = queue.Queue(maxsize=workers * 2)
+        done = threading.Event()
+
+        def decode():
+            try:
+                for item in self.sample_frames(cap, start_frame):
+                    while not done.is_set():
+                        try:
+                            frames.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+                    if done.is_set():
+                        break
+            finally:
+                frames.put(None)
+
+        decoder = threading.Thread(target=decode, daemon=True)
+        decoder.start()
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while True:
+                    item = frames.get()
+                    if item is None:
+                        break
+                    frame_index, frame = item
+                    pending.append((frame_index, frame, pool.submit(self.analyze_sample, frame, self.frame_history)))
+                    while pending and (len(pending) > workers * 2 or pending[0][2].done()):
+                        frame_index, frame, future = pending.popleft()
+                        yield (frame_index, frame, *future.result())
+                while pending:
+                    frame_index, frame, future = pending.popleft()
+                    yield (frame_index, frame, *future.result())
+        finally:
+            done.set()
+            for future in (item[2] for item in pending):
+                future.cancel()
+            # Unblock the decoder if it is waiting on a full queue, then wait for it
+            while decoder.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            decoder.join()
+
+    def checkpoint_signature(self):
+        """What a checkpoint has to agree on to be resumed: the video and everything that changes the result."""
+        # A growing file changes size and mtime between a run and its resume
+        stat = None if self.stream else self.video_path.stat()
+        return {
+            "video": str(self.video_path.resolve()),
+            "video_size": stat and stat.st_size,
+            "video_mtime_ns": stat and stat.st_mtime_ns,
+            "frame_skip": self.frame_skip,
+            "duplicate_threshold": self.duplicate_threshold,
+            "sample_interval": self.sample_interval,
+            "history_size": self.frame_history.capacity,
+            "adaptive_interval": self.adaptive_interval,
+            "settle_seconds": self.settle_seconds,
+            "keyframe_scan": self.keyframe_scan,
+            # Piped runs sample every step-th frame and analyze small gray frames
+            "pipe_step": self.pipe_step(self.fps),
+            "cascade": self.cascade and [self.cascade.duplicate_diff, self.cascade.new_diff],
+            "writer_options": self.writer_options,
+            "trained_images": len(self.trained_descriptors),
+            "global_index": self.global_index and [self.index_distance, self.index_path and str(self.index_path)],
+            "roi": [self.roi, self.save_roi_crop],
+            "exports": self.exports,
+        }
+
+    def save_checkpoint(self, checkpoint, next_frame, counts, writer):
+        with self.profiler.stage("checkpoint"):
+            checkpoint.save(next_frame, counts, self.frame_history, self.checkpoint_signature(), self.slide_index,
+                            self.region, [sink.state() for sink in writer.sinks],
+                            self._seek_sampling and self._seek_sampling[1])
+
+    def restore_checkpoint(self, checkpoint):
+        """Load the history from checkpoint and return (next_frame, counts), or (0, None) to start over."""
+        state = checkpoint.load(self.checkpoint_signature())
+        if state is None:
+            return 0, None
+        next_frame, counts, history, index_state, region, export_state, seek_sampling = state
+        for kind, sink_state in zip(self.export_kinds(), export_state or []):
+            partial = self.export_sinks[kind].partial_path(self.export_path(kind))
+            if not partial.exists() or partial.stat().st_size < sink_state["size"]:
+                print(f"Ignoring checkpoint: the partial {kind.upper()} {partial} is missing or truncated",
+                      file=sys.stderr)
+                return 0, None
+        self.region = region
+        self.export_state = export_state
+        if seek_sampling is not None:
+            # Sample the rest the way the interrupted run did
+            self._seek_sampling = (self.video_path, seek_sampling)
+        self.frame_history.clear()
+        self.frame_history.replace(history)
+        if self.slide_index is not None and index_state is not None:
+            self.slide_index = SlideIndex.from_state(*index_state, self.index_distance)
+        return next_frame, counts
+
+    def export_kinds(self):
+        return [kind for kind in self.exports if kind != "folder"]
+
+    def export_path(self, kind):
+        """Document export path next to the output folder: <output folder>.pdf or .pptx."""
+        output_folder = self.output_folder.resolve()
+        return output_folder.with_name(f"{output_folder.name}.{kind}")
+
+    def open_writer(self):
+        """A SlideWriter for the configured exports, continuing the partial documents of a restored checkpoint."""
+        states = self.export_state or [None] * len(self.export_kinds())
+        sinks = []
+        try:
+            for kind, state in zip(self.export_kinds(), states):
+                sinks.append(self.export_sinks[kind](self.export_path(kind), state))
+        except BaseException:
+            for sink in sinks:
+                sink.suspend()
+            raise
+        self.export_state = None
+        return SlideWriter(**self.writer_options, save_files="folder" in self.exports,
+                           export=bool(sinks), sinks=sinks, profiler=self.profiler)
+
+    def read_frame(self, cap, frame_index):
+        with self.profiler.stage("seek"):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = cap.read()
+        self.profiler.count("frames_decoded")
+        if not ret:
+            raise RuntimeError(f"Couldn't read frame {frame_index}")
+        return frame
+
+    def extract_segment(self, start_frame, end_frame, image_folder, sync_window=512, stop_event=None):
+        """
+        Run the serial extraction over one frame range, starting from an empty history.
+
+        Unique slides are written to image_folder, named by frame index. The
+        result carries every sample's local verdict plus the grayscale
+        thumbnails of the first sync_window samples, which is what
+        merge_segment needs to redo the decisions with the real history
+        until the two runs line up.
+        """
+        image_folder = Path(image_folder)
+        image_folder.mkdir(parents=True, exist_ok=True)
+        self.frame_history.clear()
+        verdicts = []
+        thumbnails = {}
+        cap = cv2.VideoCapture(str(self.video_path))
+        writer = SlideWriter(**self.writer_options, save_files="folder" in self.exports,
+                             export=bool(self.export_kinds()), profiler=self.profiler)
+        try:
+            for frame_index, frame in self.sample_frames(cap, start_frame, end_frame):
+                if stop_event is not None and stop_event.is_set():
+                    self.should_stop = True
+                    break
+                view = self.crop(frame)
+                fingerprint = tiny = None
+                if len(thumbnails) < sync_window:
+                    thumbnail = FingerprintStore.thumbnail(view)
+                    tiny = FingerprintStore.tiny_thumbnail(view)
+                    thumbnails[frame_index] = (thumbnail, tiny)
+                    fingerprint = FingerprintStore.from_thumbnail(thumbnail)
+                verdict = self.classify(view, fingerprint, tiny=tiny)
+                if verdict == "unique":
+                    writer.write(writer.path_for(image_folder, f"{frame_index:09d}"), self.slide_image(frame))
+                    self.remember(view, fingerprint, tiny, frame_index)
+                verdicts.append((frame_index, verdict))
+        finally:
+            writer.close()
+            cap.release()
+        return {
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "verdicts": verdicts,
+            "thumbnails": thumbnails,
+            "history": self.frame_history.ordered(),
+            "write_stats": writer.stats,
+            "profile": self.profiler.snapshot() if self.profiler.enabled else None,
+            "stopped": self.should_stop,
+        }
+
+    def merge_segment(self, cap, result, image_folder, counts, writer):
+        """
+        Fold one segment into the global result, in order.
+
+        While the global history differs from the one the segment started
+        with, each sample is re-decided from its thumbnail (frames that now
+        need a trained-model check or saving are re-read by seeking). Once
+        both histories hold the same slides every later local verdict is
+        the serial one too. If they never line up inside the thumbnail
+        window, the rest of the segment is processed serially here.
+        """
+        image_folder = Path(image_folder)
+        local_ids = deque(maxlen=self.frame_history.capacity)
+        thumbnails = result["thumbnails"]
+        synced = self.frame_history.frame_ids() == set(local_ids)
+
+        for frame_index, local_verdict in result["verdicts"]:
+            frame = None
+            if synced:
+                verdict = local_verdict
+            elif frame_index in thumbnails:
+                thumbnail, tiny = thumbnails[frame_index]
+                fingerprint = FingerprintStore.from_thumbnail(thumbnail)
+                # The segment only ran the trained-model check on frames it didn't drop as duplicates
+                verdict = self.classify(None, fingerprint, local_verdict == "trained", tiny)
+                if verdict == "unique" and local_verdict == "duplicate":
+                    frame = self.read_frame(cap, frame_index)
+                    if self.matches_trained_model(self.crop(frame)):
+                        verdict = "trained"
+            else:
+                self._finish_segment_serially(cap, frame_index, result["end_frame"], counts, writer)
+                return
+
+            counts[verdict] += 1
+            if verdict == "unique":
+                output_path = writer.path_for(self.output_folder, f"slide_{counts['unique'] - 1:05d}")
+                if local_verdict == "unique":
+                    writer.adopt(writer.path_for(image_folder, f"{frame_index:09d}"), output_path)
                 else:
-                    remaining_str = "--:--:--"
-                    speed_str = "0.0 fps"
-                
-                progress_callback(frame_count, total_frames, saved_count, duplicates, trained_matches, elapsed_str, remaining_str, speed_str)
+                    frame = frame if frame is not None else self.read_frame(cap, frame_index)
+                    writer.write(output_path, self.slide_image(frame))
+                if not synced:
+                    self.frame_history.append(fingerprint, tiny, frame_index)
+            if local_verdict == "unique":
+                local_ids.append(frame_index)
+            synced = synced or self.frame_history.frame_ids() == set(local_ids)
+
+        if synced:
+            self.frame_history.replace(result["history"])
+
+    def _finish_segment_serially(self, cap, start_frame, end_frame, counts, writer):
+        for frame_index, frame in self.sample_frames(cap, start_frame, end_frame):
+            view = self.crop(frame)
+            verdict = self.classify(view)
+            counts[verdict] += 1
+            if verdict == "unique":
+                output_path = writer.path_for(self.output_folder, f"slide_{counts['unique'] - 1:05d}")
+                writer.write(output_path, self.slide_image(frame))
+                self.remember(view, frame_index=frame_index)
 
-        cap.release()
+    def process_segments(self, cap, total_frames, start_frame=0, counts=None, checkpoint=None):
+        """
+        Split the video from start_frame on into segment_workers frame ranges,
+        extract each in its own process and merge the results in order.
+
+        counts and the current frame_history carry the state at start_frame
+        when resuming; a checkpoint is saved after every merged segment.
+        """
+        workers = self.segment_workers
+        bounds = [start_frame + (total_frames - start_frame) * i // workers for i in range(workers + 1)]
+        settings = {
+            "options": {
+                "frame_skip": self.frame_skip,
+                "duplicate_threshold": self.duplicate_threshold,
+                "sample_interval": self.sample_interval,
+                "history_size": self.frame_history.capacity,
+                "adaptive_interval": self.adaptive_interval,
+                "settle_seconds": self.settle_seconds,
+                "keyframe_scan": self.keyframe_scan,
+                "profile": self.profiler.enabled,
+                "save_roi_crop": self.save_roi_crop,
+                "exports": self.exports,
+            },
+            "region": self.region,
+            "seek_sampling": bool(self.sample_interval) and self.seeks_samples(cap, cap.get(cv2.CAP_PROP_FPS)),
+            "video_path": str(self.video_path),
+            "trained_source": self.trained_source,
+            "writer_options": self.writer_options,
+        }
+        work_folder = self.output_folder.resolve().with_name(self.output_folder.resolve().name + ".segments")
+        shutil.rmtree(work_folder, ignore_errors=True)
+        if self.cascade:
+            settings["cascade"] = (self.cascade.duplicate_diff, self.cascade.new_diff)
+        counts = counts or {"unique": 0, "duplicate": 0, "trained": 0}
+
+        context = multiprocessing.get_context("spawn")
+        stop_event = context.Event()
+        writer = self.open_writer()
+        segment_stats = []
+        merged = False
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_init_segment_worker, initargs=(stop_event,)) as pool:
+                # The last segment runs to the real end: CAP_PROP_FRAME_COUNT is only an estimate for some containers
+                ends = bounds[1:-1] + [None]
+                futures = [
+                    pool.submit(_extract_segment, settings, bounds[i], ends[i], str(work_folder / f"{i:03d}"))
+                    for i in range(workers)
+                ]
+                for i, future in enumerate(futures):
+                    while True:
+                        try:
+                            result = future.result(timeout=0.2)
+                            break
+                        except FuturesTimeout:
+                            if self.should_stop:
+                                stop_event.set()
+                    if result["stopped"] or self.should_stop:
+                        self.should_stop = True
+                        break
+                    segment_stats.append(result["write_stats"])
+                    if result["profile"]:
+                        self.profiler.merge(result["profile"])
+                    self.merge_segment(cap, result, work_folder / f"{i:03d}", counts, writer)
+                    if checkpoint and i + 1 < workers:
+                        writer.flush()
+                        self.save_checkpoint(checkpoint, bounds[i + 1], counts, writer)
+                    self.progress.publish(bounds[i + 1], counts, force=True)
+                if self.should_stop:
+                    stop_event.set()
+                    for future in futures:
+                        future.cancel()
+                merged = not self.should_stop
+        finally:
+            try:
+                # Keep partial documents for --resume; the checkpoint after the last merged segment points into them
+                writer.close(finalize=merged or checkpoint is None)
+            finally:
+                self.counts = counts
+                self.write_stats = {key: writer.stats[key] + sum(stats[key] for stats in segment_stats)
+                                    for key in writer.stats}
+                shutil.rmtree(work_folder, ignore_errors=True)
         return not self.should_stop
 
+    def process_video(self, progress_callback=None):
+        """
+        Extract the slides of video_path into output_folder.
+
+        Progress goes to self.progress; progress_callback, if given, receives
+        every snapshot it lets through (a dict, see ProgressChannel.publish)
+        on the processing thread. With profiling on, a JSON run report is
+        written to report_path at the end.
+        """
+        self.profiler.reset()
+        completed = self._process_video(progress_callback)
+        if self.profiler.enabled:
+            self.write_report(completed)
+        return completed
+
+    def write_report(self, completed):
+        counts = self.counts or {}
+        report = {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "completed": completed,
+            "error": self.progress.error,
+            "settings": self.checkpoint_signature() if self.video_path.exists() else None,
+            "total_frames": self.progress.total_frames,
+            "resumed_from": self.progress.start_frame,
+            "counts": counts,
+            "write_stats": self.write_stats,
+            "cascade_hits": self.cascade.hits if self.cascade else None,
+            "slide_region": self.region,
+            "exports": self.exports,
+            **self.profiler.report(),
+        }
+        report["counters"]["frames_sampled"] = sum(counts.values())
+        path = Path(self.report_path) if self.report_path else \
+            self.output_folder.resolve().with_name(self.output_folder.resolve().name + ".report.json")
+        path.write_text(json.dumps(report, indent=2))
+        return path
+
+    def _process_video(self, progress_callback=None):
+        self.progress.reset(progress_callback)
+        self.should_stop = False
+        self.stream_sources = []
+        if self.stream:
+            self.restrict_to_streaming()
+        elif not self.video_path.exists():
+            self.progress.fail(f"{self.video_path.name} not found!")
+            return False
+
+        try:
+            cap = self.open_capture()
+        except FileNotFoundError:
+            self.progress.fail(f"{self.video_path.name} not found!")
+            return False
+        except (TypeError, cv2.error):
+            # Builds before 4.11 have no VideoCapture overload for Python stream sources
+            self.progress.fail(f"Streaming needs OpenCV 4.11 or newer (this is {cv2.__version__})")
+            return False
+        if not cap.isOpened():
+            self.progress.fail("Couldn't open video file!")
+            return False
+
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.prepare()
+
+        self.frame_history.clear()
+        self.slide_index = None
+        if self.index_path:
+            # Slides of earlier runs over this same video are left out, so a rerun saves them again
+            # (indexes written before labels held the full path only have the file name to go by)
+            self.slide_index = SlideIndex.load(self.index_path, self.index_distance,
+                                               (self.index_label(), f"{self.video_path.name}:"))
+        elif self.global_index:
+            self.slide_index = SlideIndex(self.index_distance)
+        checkpoint = Checkpoint(self.output_folder) if self.checkpoint_seconds is not None else None
+        start_frame, counts = 0, None
+        self.region = None
+        if checkpoint and self.resume:
+            start_frame, counts = self.restore_checkpoint(checkpoint)
+        elif checkpoint:
+            checkpoint.clear()
+        self.region_tracker = None
+        if self.roi:
+            if counts is None:
+                self.region = self.probe_region(start_frame)
+            self.region_tracker = SlideRegionTracker(self.region)
+        self.progress.total_frames = total_frames
+        self.progress.start_frame = start_frame
+        counts = counts or {"unique": 0, "duplicate": 0, "trained": 0}
+
+        use_segments = self.segment_workers > 1 and total_frames > start_frame
+        if use_segments and self.slide_index is not None:
+            print("The global slide index needs frames in order, running without segments", file=sys.stderr)
+            use_segments = False
+        if use_segments:
+            try:
+                completed = self.process_segments(cap, total_frames, start_frame, counts, checkpoint)
+            finally:
+                cap.release()
+            if checkpoint and completed:
+                checkpoint.clear()
+            return completed
+
+        samples = self.piped_samples(cap, start_frame) if self.pipe_decoder else None
+        # Piped frames are small and gray, so slides are read again from cap at full size
+        downscaled = samples is not None
+        if samples is None and self.pipeline_workers > 1:
+            samples = self.pipelined_samples(cap, self.pipeline_workers, start_frame)
+        elif samples is None:
+            samples = ((frame_index, frame, None, None, None)
+                       for frame_index, frame in self.sample_frames(cap, start_frame))
+        writer = self.open_writer()
+        next_frame = start_frame
+        last_checkpoint = time.time()
+        completed = False
+
+        try:
+            for frame_index, frame, fingerprint, trained_match, analyzed_region in samples:
+                if self.should_stop:
+                    break
+                if self.region_tracker and self.region_tracker.observe(frame, self.frame_size):
+                    self.region = self.region_tracker.region
+                    # Fingerprints of another crop can't be compared with the new one
+                    self.frame_history.clear()
+                if fingerprint is not None and analyzed_region != self.region:
+                    fingerprint = trained_match = None
+                view = self.crop(frame)
+                verdict = self.classify(view, fingerprint, trained_match)
+                counts[verdict] += 1
+                if verdict == "unique":
+                    slide = self.read_frame(cap, frame_index) if downscaled else frame
+                    writer.write(writer.path_for(self.output_folder, f"slide_{counts['unique'] - 1:05d}"),
+                                 self.slide_image(slide))
+                    self.remember(view, fingerprint, frame_index=frame_index)
+
+                next_frame = frame_index + 1
+                if self.stream and next_frame > self.progress.total_frames:
+                    # The container may not know its length while it is being written
+                    self.progress.total_frames = next_frame
+                self.progress.publish(next_frame, counts)
+                if checkpoint and time.time() - last_checkpoint >= self.checkpoint_seconds:
+                    writer.flush()
+                    self.save_checkpoint(checkpoint, next_frame, counts, writer)
+                    last_checkpoint = time.time()
+            completed = not self.should_stop
+        finally:
+            samples.close()
+            write_error = None
+            try:
+                # Flush whatever is still queued, also when stopped early; partial documents stay for --resume
+                writer.close(finalize=completed or checkpoint is None)
+            except Exception as e:
+                write_error = e
+                completed = False
+            self.write_stats = writer.stats
+            self.counts = counts
+            cap.release()
+            self.progress.publish(max(total_frames, next_frame) if completed else next_frame, counts, force=True)
+            if checkpoint:
+                if completed:
+                    checkpoint.clear()
+                elif write_error is None:
+                    # Every sample before next_frame is fully accounted for, even after an error in the loop
+                    self.save_checkpoint(checkpoint, next_frame, counts, writer)
+                # After a failed write, the last checkpoint (saved right after a good flush) stays the resume point
+            if completed and self.index_path:
+                self.slide_index.save(self.index_path)
+            if write_error is not None:
+                raise write_error
+        return completed
+
+_segment_stop_event = None
+
+
+def _init_segment_worker(stop_event):
+    global _segment_stop_event
+    _segment_stop_event = stop_event
+
+
+def _extract_segment(settings, start_frame, end_frame, image_folder):
+    processor = UltimateSlideProcessor(**settings["options"], video_path=settings["video_path"],
+                                       writer_options=settings["writer_options"])
+    if "cascade" in settings:
+        processor.cascade = CascadeGate(*settings["cascade"])
+    processor.region = settings["region"]
+    processor._seek_sampling = (processor.video_path, settings["seek_sampling"])
+    processor.use_trained_source(settings["trained_source"])
+    return processor.extract_segment(start_frame, end_frame, image_folder, stop_event=_segment_stop_event)
+
+VIDEO_SUFFIXES = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+_batch_settings = None
+
+
+def _init_batch_worker(settings):
+    global _batch_settings
+    _batch_settings = settings
+
+
+def _run_batch_job(video_path, output_folder):
+    processor = UltimateSlideProcessor(**_batch_settings["options"], video_path=video_path,
+                                       output_folder=output_folder)
+    if _batch_settings["cascade"]:
+        processor.cascade = CascadeGate(*_batch_settings["cascade"])
+    processor.use_trained_source(_batch_settings["trained_source"])
+    start = time.time()
+    completed = processor.process_video()
+    return {
+        "video": str(video_path),
+        "output": str(output_folder),
+        "completed": completed,
+        "seconds": time.time() - start,
+        "counts": processor.counts,
+        "write_stats": processor.write_stats,
+    }
+
+
+def list_batch_videos(source):
+    """
+    Videos to process for a batch: every video file in a directory, or the
+    paths listed one per line in a manifest file (blank lines and # comments
+    are skipped, relative paths resolve against the manifest's folder).
+    """
+    source = Path(source)
+    if source.is_dir():
+        return sorted(path for path in source.iterdir() if path.suffix.lower() in VIDEO_SUFFIXES)
+    videos = []
+    for line in source.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            videos.append(source.parent / line)
+    return videos
+
+
+def batch_output_names(videos):
+    """
+    Output subfolder name for every batch video: the file name without
+    extension, plus the parent folder's name (or failing that the
+    extension, or failing that a number) where names collide, so no two
+    jobs share a folder or checkpoint.
+    """
+    paths = [Path(video) for video in videos]
+    groups = {}
+    for path in paths:
+        groups.setdefault(path.stem.lower(), []).append(path)
+    names, taken = [], set()
+    for path in paths:
+        group = groups[path.stem.lower()]
+        name = path.stem
+        if len(group) > 1:
+            if len({other.parent.name.lower() for other in group}) == len(group):
+                name = f"{path.parent.name}_{path.stem}"
+            elif len({other.suffix.lower() for other in group}) == len(group):
+                name = f"{path.stem}_{path.suffix.lstrip('.')}"
+        unique, number = name, 2
+        # Compared case-insensitively, as folder names are on Windows and macOS
+        while unique.lower() in taken:
+            unique, number = f"{name}_{number}", number + 1
+        taken.add(unique.lower())
+        names.append(unique)
+    return names
+
+
+def run_batch(videos, output_root, options, trainer_folder=None, cascade=None, jobs=None):
+    """
+    Process many videos on a process pool, each into its own subfolder of
+    output_root (see batch_output_names).
+
+    The trainer is loaded once up front; workers map the same descriptor
+    cache file (or get one copy each when it can't be written), so no worker
+    recomputes ORB features for the trainer.
+
+    Yields:
+        dict: One summary per video, in completion order
+    """
+    loader = UltimateSlideProcessor(trainer_folder=trainer_folder)
+    loader.trainer_folder.mkdir(parents=True, exist_ok=True)
+    loader.load_trained_model()
+    settings = {
+        "options": options,
+        "cascade": cascade and (cascade.duplicate_diff, cascade.new_diff),
+        "trained_source": loader.trained_source,
+    }
+    output_root = Path(output_root)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=_init_batch_worker, initargs=(settings,)) as pool:
+        futures = {}
+        for video, name in zip(videos, batch_output_names(videos)):
+            output_folder = output_root / name
+            futures[pool.submit(_run_batch_job, str(video), str(output_folder))] = video
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {"video": str(futures[future]), "completed": False, "error": str(e)}
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Extract unique slides from lecture videos. Without --input or --batch the GUI starts.")
+    parser.add_argument("--input", help="Video to process")
+    parser.add_argument("--batch", help="Directory of videos, or a manifest file with one video path per line")
+    parser.add_argument("--output", help="Output folder (per-video subfolders in batch mode)")
+    parser.add_argument("--trainer", help="Folder of unwanted example frames")
+    parser.add_argument("--jobs", type=int, default=None, help="Videos processed at once in batch mode")
+    parser.add_argument("--frame-skip", type=int, default=30)
+    parser.add_argument("--threshold", type=float, default=0.98, help="Duplicate similarity threshold")
+    parser.add_argument("--history", type=int, default=5, help="Recent slides compared for duplicates")
+    parser.add_argument("--sample-interval", type=float, help="Sample every N seconds instead of --frame-skip")
+    parser.add_argument("--adaptive-interval", type=float, help="Coarse grid (s) for transition bisection")
+    parser.add_argument("--keyframe-scan", action="store_true", help="Decode only keyframes and packet spikes")
+    parser.add_argument("--cascade", action="store_true", help="Settle obvious frames from tiny thumbnails")
+    parser.add_argument("--pipeline-workers", type=int, default=0)
+    parser.add_argument("--segments", type=int, default=0, help="Processes for segment-parallel extraction")
+    parser.add_argument("--format", default="jpg", choices=("jpg", "png", "webp"))
+    parser.add_argument("--quality", type=int, default=100, help="JPEG/WebP quality")
+    parser.add_argument("--max-size", type=parse_size, help="Downscale slides to fit WIDTHxHEIGHT")
+    parser.add_argument("--export", nargs="+", default=["folder"], choices=("folder", "pdf", "pptx"),
+                        help="Where slides go as they are found: image files in the output folder and/or "
+                             "<output folder>.pdf / .pptx (JPEG at --quality)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of an interrupted run")
+    parser.add_argument("--global-index", action="store_true",
+                        help="Skip slides seen anywhere earlier in the video, not only among the last --history")
+    parser.add_argument("--index", help="Slide index file shared by runs of one course (implies --global-index)")
+    parser.add_argument("--roi", action="store_true",
+                        help="Detect the slide rectangle (ignoring webcam insets and letterbox) and compare only that")
+    parser.add_argument("--save-crop", action="store_true", help="With --roi, save just the slide rectangle")
+    parser.add_argument("--pipe-decoder", action="store_true",
+                        help="Decode small gray analysis frames with ffmpeg; slides are re-read at full size")
+    parser.add_argument("--stream", action="store_true",
+                        help="Extract from --input while it is still being downloaded or written")
+    parser.add_argument("--profile", action="store_true", help="Time every stage and write a JSON run report")
+    parser.add_argument("--report", help="Path of the run report (default: <output folder>.report.json)")
+    return parser
+
+
+def print_progress(snapshot):
+    if snapshot["message"]:
+        return
+    total = snapshot["total"] or 1
+    print(f"\r{snapshot['frame']}/{snapshot['total']} frames ({snapshot['frame'] / total:.0%}) | "
+          f"{snapshot['unique']} slides | {snapshot['fps']:.0f} fps | "
+          f"{format_duration(snapshot['remaining'])} left", end="", file=sys.stderr, flush=True)
+
+
+def run_cli(args):
+    options = {
+        "frame_skip": args.frame_skip,
+        "duplicate_threshold": args.threshold,
+        "history_size": args.history,
+        "sample_interval": args.sample_interval,
+        "adaptive_interval": args.adaptive_interval,
+        "keyframe_scan": args.keyframe_scan,
+        "pipeline_workers": args.pipeline_workers,
+        "segment_workers": args.segments,
+        "writer_options": {"image_format": args.format, "quality": args.quality, "max_size": args.max_size},
+        "resume": args.resume,
+        "profile": args.profile,
+        "global_index": args.global_index,
+        "index_path": args.index,
+        "roi": args.roi,
+        "save_roi_crop": args.save_crop,
+        "pipe_decoder": args.pipe_decoder,
+        "exports": args.export,
+        "stream": args.stream,
+    }
+    cascade = CascadeGate() if args.cascade else None
+
+    if args.batch:
+        videos = list_batch_videos(args.batch)
+        output_root = Path(args.output or "unique_slides")
+        failures = 0
+        jobs = args.jobs
+        if args.index and jobs != 1:
+            # Each video has to see the slides of the ones before it
+            print("--index processes batch videos one at a time", file=sys.stderr)
+            jobs = 1
+        for summary in run_batch(videos, output_root, options, args.trainer, cascade, jobs):
+            if summary["completed"]:
+                counts = summary["counts"]
+                print(f"{summary['video']}: {counts['unique']} slides, {counts['duplicate']} duplicates, "
+                      f"{counts['trained']} trained matches in {summary['seconds']:.1f} s")
+            else:
+                failures += 1
+                print(f"{summary['video']}: failed {summary.get('error', '')}", file=sys.stderr)
+        return 1 if failures else 0
+
+    processor = UltimateSlideProcessor(**options, cascade=cascade, report_path=args.report, video_path=args.input,
+                                       output_folder=args.output, trainer_folder=args.trainer)
+    # Only draw a progress line for a terminal; otherwise snapshots are simply not consumed
+    completed = processor.process_video(print_progress if sys.stderr.isatty() else None)
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    if not completed:
+        print(f"Couldn't process {args.input}: {processor.progress.error or 'stopped'}", file=sys.stderr)
+        return 1
+    counts = processor.counts
+    destinations = [str(processor.output_folder) if kind == "folder" else str(processor.export_path(kind))
+                    for kind in processor.exports]
+    print(f"{counts['unique']} slides, {counts['duplicate']} duplicates, "
+          f"{counts['trained']} trained matches -> {', '.join(destinations)}")
+    return 0
+
+
 class SlideProcessorApp:
     def __init__(self, root):
+        load_tkinter()
         self.root = root
         self.root.title("Ultimate Slide Processor")
         self.frame_skip = tk.IntVar(value=30)
+        self.sample_interval = tk.DoubleVar(value=0)
+        self.use_cascade = tk.BooleanVar(value=False)
+        self.adaptive_interval = tk.DoubleVar(value=0)
+        self.keyframe_scan = tk.BooleanVar(value=False)
+        self.image_format = tk.StringVar(value="jpg")
+        self.image_quality = tk.IntVar(value=100)
+        self.resume = tk.BooleanVar(value=False)
+        self.global_index = tk.BooleanVar(value=False)
+        self.use_roi = tk.BooleanVar(value=False)
+        self.export_pdf = tk.BooleanVar(value=False)
+        self.export_pptx = tk.BooleanVar(value=False)
         self.duplicate_threshold = tk.DoubleVar(value=0.98)
         self.processor = None
         self.processing = False
@@ -185,6 +2568,20 @@ class SlideProcessorApp:
         self.frame_skip_spinbox = ttk.Spinbox(frame_skip_frame, from_=1, to=100, textvariable=self.frame_skip, width=5)
         self.frame_skip_spinbox.pack(side=tk.RIGHT)
 
+        # Sample Interval (seconds, 0 = use frame skip)
+        interval_frame = ttk.Frame(params_frame)
+        interval_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(interval_frame, text="Sample Every N Seconds (0 = off):").pack(side=tk.LEFT)
+        self.interval_spinbox = ttk.Spinbox(interval_frame, from_=0, to=600, increment=0.5, textvariable=self.sample_interval, width=5)
+        self.interval_spinbox.pack(side=tk.RIGHT)
+
+        # Adaptive transition search (seconds, 0 = off)
+        adaptive_frame = ttk.Frame(params_frame)
+        adaptive_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(adaptive_frame, text="Adaptive Search Every N Seconds (0 = off):").pack(side=tk.LEFT)
+        self.adaptive_spinbox = ttk.Spinbox(adaptive_frame, from_=0, to=600, increment=1, textvariable=self.adaptive_interval, width=5)
+        self.adaptive_spinbox.pack(side=tk.RIGHT)
+
         # Similarity Threshold
         similarity_frame = ttk.Frame(params_frame)
         similarity_frame.pack(fill=tk.X, pady=5)
@@ -193,6 +2590,41 @@ class SlideProcessorApp:
         self.similarity_slider.set(0.98)
         self.similarity_slider.pack(side=tk.RIGHT, fill=tk.X, expand=True)
 
+        # Cascade gate
+        ttk.Checkbutton(params_frame, text="Settle obvious frames from tiny thumbnails (faster)",
+                        variable=self.use_cascade).pack(anchor=tk.W, pady=5)
+
+        # Keyframe pre-scan
+        ttk.Checkbutton(params_frame, text="Only decode keyframes and packet spikes (needs ffprobe)",
+                        variable=self.keyframe_scan).pack(anchor=tk.W, pady=5)
+
+        # Output format
+        format_frame = ttk.Frame(params_frame)
+        format_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(format_frame, text="Slide Format / Quality:").pack(side=tk.LEFT)
+        ttk.Spinbox(format_frame, from_=1, to=100, textvariable=self.image_quality, width=5).pack(side=tk.RIGHT)
+        ttk.Combobox(format_frame, values=("jpg", "png", "webp"), textvariable=self.image_format,
+                     state="readonly", width=6).pack(side=tk.RIGHT, padx=5)
+
+        # Document exports, built while extracting
+        export_frame = ttk.Frame(params_frame)
+        export_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(export_frame, text="Also build:").pack(side=tk.LEFT)
+        ttk.Checkbutton(export_frame, text="PDF", variable=self.export_pdf).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(export_frame, text="PowerPoint", variable=self.export_pptx).pack(side=tk.LEFT, padx=5)
+
+        # Global slide index
+        ttk.Checkbutton(params_frame, text="Skip slides shown anywhere earlier, not just recently",
+                        variable=self.global_index).pack(anchor=tk.W, pady=5)
+
+        # Slide region
+        ttk.Checkbutton(params_frame, text="Only compare the slide area (ignore webcam insets and black bars)",
+                        variable=self.use_roi).pack(anchor=tk.W, pady=5)
+
+        # Resume
+        ttk.Checkbutton(params_frame, text="Resume from checkpoint of an interrupted run",
+                        variable=self.resume).pack(anchor=tk.W, pady=5)
+
         # Current values display
         values_frame = ttk.Frame(params_frame)
         values_frame.pack(fill=tk.X, pady=5)
@@ -267,33 +2699,56 @@ class SlideProcessorApp:
         
         self.processor = UltimateSlideProcessor(
             frame_skip=self.frame_skip.get(),
-            duplicate_threshold=self.duplicate_threshold.get()
+            duplicate_threshold=self.duplicate_threshold.get(),
+            sample_interval=self.sample_interval.get() or None,
+            pipeline_workers=os.cpu_count() or 1,
+            cascade=CascadeGate() if self.use_cascade.get() else None,
+            adaptive_interval=self.adaptive_interval.get() or None,
+            keyframe_scan=self.keyframe_scan.get(),
+            writer_options={"image_format": self.image_format.get(), "quality": self.image_quality.get()},
+            resume=self.resume.get(),
+            global_index=self.global_index.get(),
+            roi=self.use_roi.get(),
+            exports=["folder"] + [kind for kind, var in (("pdf", self.export_pdf), ("pptx", self.export_pptx))
+                                  if var.get()]
         )
         self.processor.video_path = self.video_path
         
         # Run processing in a separate thread
-        import threading
         processing_thread = threading.Thread(
             target=self.run_processing, 
             daemon=True
         )
         processing_thread.start()
+        self.root.after(100, self.poll_progress)
 
     def run_processing(self):
-        completed = self.processor.process_video(progress_callback=self.update_progress)
+        completed = self.processor.process_video()
         self.root.after(0, self.processing_complete, completed)
 
-    def update_progress(self, current, total, unique, duplicates, matches, elapsed_str, remaining_str, speed_str):
-        progress = (current / total) * 100
+    def poll_progress(self):
+        # Runs on the Tk thread; the worker only publishes to the processor's channel
+        snapshot = self.processor.progress.poll()
+        if snapshot:
+            self.update_progress(snapshot)
+        if self.processing:
+            self.root.after(100, self.poll_progress)
+
+    def update_progress(self, snapshot):
+        if snapshot["message"]:
+            self.progress_label.config(text=snapshot["message"])
+            return
+        current, total = snapshot["frame"], snapshot["total"]
+        progress = (current / total) * 100 if total else 0
         self.progress_bar["value"] = progress
         
         # Update all labels
         self.progress_label.config(text=f"Processing: {current}/{total} frames ({progress:.1f}%)")
-        self.stats_label.config(text=f"Unique: {unique} | Duplicates: {duplicates} | Matches: {matches}")
-        self.time_label.config(text=f"Elapsed: {elapsed_str} | Remaining: {remaining_str} | Speed: {speed_str}")
-        
-        # Force GUI update
-        self.root.update_idletasks()
+        self.stats_label.config(text=f"Unique: {snapshot['unique']} | Duplicates: {snapshot['duplicate']} "
+                                     f"| Matches: {snapshot['trained']}")
+        self.time_label.config(text=f"Elapsed: {format_duration(snapshot['elapsed'])} | "
+                                    f"Remaining: {format_duration(snapshot['remaining'])} | "
+                                    f"Speed: {snapshot['fps']:.1f} fps")
 
     def stop_processing(self):
         if self.processor and self.processing:
@@ -305,10 +2760,22 @@ class SlideProcessorApp:
         self.processing = False
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
+        snapshot = self.processor.progress.poll()
+        if snapshot:
+            self.update_progress(snapshot)
         
-        if completed:
+        stats = self.processor.write_stats
+        if self.processor.progress.error:
+            messagebox.showerror("Error", self.processor.progress.error)
+        elif completed:
             self.progress_label.config(text="Processing completed successfully!")
-            messagebox.showinfo("Processing Complete", "Video processing completed successfully!")
+            summary = "Video processing completed successfully!"
+            if stats:
+                summary += (f"\n\n{stats['slides']} slides, {stats['bytes'] / 1e6:.1f} MB written "
+                            f"({stats['encode_seconds']:.1f} s encoding)")
+            for kind in self.processor.export_kinds():
+                summary += f"\n{kind.upper()}: {self.processor.export_path(kind)}"
+            messagebox.showinfo("Processing Complete", summary)
         else:
             self.progress_label.config(text="Processing stopped by user")
             messagebox.showinfo("Processing Stopped", "Video processing was stopped by user")
@@ -319,8 +2786,16 @@ class SlideProcessorApp:
             self.video_path = default_path / "video.mp4"
             self.file_status.config(text="Found video.mp4", foreground="green")
 
-if __name__ == "__main__":
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.input or args.batch:
+        return run_cli(args)
     hide_console()
+    load_tkinter()
     root = tk.Tk()
     app = SlideProcessorApp(root)
     root.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
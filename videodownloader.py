@@ -1,158 +1,465 @@
-from pytubefix import YouTube
-from pytubefix.cli import on_progress
 import subprocess
+import contextlib
 import os
+import json
+import io
+import threading
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import time
 from datetime import datetime, timedelta
 
+CHUNK_SIZE = 8 * 1024 * 1024  # YouTube throttles range requests much larger than ~10 MB
+SLIDES_MIN_HEIGHT = 720  # Lowest resolution that keeps typical slide text legible
+PROFILES = {
+    "full": "Full video (best video + audio)",
+    "slides": f"Slides only ({SLIDES_MIN_HEIGHT}p video, no audio)",
+}
+
+
+def probe_size(url, timeout=30):
+    """
+    Ask the server for the size of url and whether it honours range requests.
+
+    Returns:
+        tuple: (size in bytes or None, ranges supported)
+    """
+    request = urllib.request.Request(url, headers={"Range": "bytes=0-0"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        content_range = response.headers.get("Content-Range", "")
+        if response.status == 206 and "/" in content_range and not content_range.endswith("/*"):
+            return int(content_range.rsplit("/", 1)[1]), True
+        length = response.headers.get("Content-Length")
+        return (int(length) if length else None), False
+
+
+class RangeDownload:
+    """
+    Download one URL into path with parallel HTTP range requests.
+
+    The file is fetched in chunk_size pieces into <path>.part, and finished
+    chunks are recorded in <path>.part.json so an interrupted download
+    continues where it stopped. Servers that ignore Range get a single plain
+    GET instead. progress, if given, is called with every block of bytes
+    received, from the downloading threads.
+
+    With in_order, chunks are still fetched in parallel but appended to path
+    itself strictly in order, so the file is always a valid prefix that can
+    be read while it grows (main_extract's stream mode); <path>.part.json
+    exists until the download is complete.
+    """
+
+    def __init__(self, url, path, size=None, connections=4, chunk_size=CHUNK_SIZE, progress=None,
+                 stop_event=None, retries=3, timeout=30, in_order=False):
+        self.url = url
+        self.path = path
+        self.size = size
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.progress = progress or (lambda count: None)
+        self.stop_event = stop_event or threading.Event()
+        self.retries = retries
+        self.timeout = timeout
+        self.in_order = in_order
+        self.part_path = path if in_order else path + ".part"
+        self.state_path = path + ".part.json"
+        self.lock = threading.Lock()
+        self.done = set()
+
+    def load_state(self):
+        """Finished chunk indices of an earlier attempt, if it was for the same file and chunking."""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get("size") != self.size or state.get("chunk_size") != self.chunk_size \
+                or not os.path.exists(self.part_path):
+            return set()
+        done = set(state["done"])
+        if self.in_order:
+            # Only a prefix of whole chunks counts; the file may hold part of the next one
+            return done if done == set(range(len(done))) and \
+                os.path.getsize(self.part_path) >= len(done) * self.chunk_size else set()
+        return done if os.path.getsize(self.part_path) == self.size else set()
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"size": self.size, "chunk_size": self.chunk_size, "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self):
+        ranged = True
+        if self.size is None:
+            self.size, ranged = probe_size(self.url, self.timeout)
+        if not ranged or not self.size:
+            if self.in_order:
+                self.save_state()  # Marks the file as still growing
+            self._fetch_whole()
+        elif self.in_order:
+            self._fetch_in_order()
+        else:
+            self._fetch_ranges()
+        if not self.in_order:
+            os.replace(self.part_path, self.path)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return self.path
+
+    def _fetch_ranges(self):
+        self.done = self.load_state()
+        if not self.done:
+            with open(self.part_path, "wb") as f:
+                f.truncate(self.size)
+        chunks = [i for i in range((self.size + self.chunk_size - 1) // self.chunk_size) if i not in self.done]
+        self.progress(sum(min(self.chunk_size, self.size - i * self.chunk_size) for i in self.done))
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            futures = [pool.submit(self._fetch_chunk, i) for i in chunks]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                self.stop_event.set()
+                raise
+
+    def _fetch_in_order(self):
+        self.done = self.load_state()
+        offset = len(self.done) * self.chunk_size
+        chunks = range(len(self.done), (self.size + self.chunk_size - 1) // self.chunk_size)
+        self.progress(min(offset, self.size))
+        self.save_state()
+        with open(self.part_path, "r+b" if offset else "wb") as f, \
+                ThreadPoolExecutor(max_workers=self.connections) as pool:
+            f.truncate(offset)
+            f.seek(offset)
+            # A few chunks per connection in flight: enough to keep every connection busy while
+            # the oldest one completes, without holding more than that in memory
+            pending = deque()
+            try:
+                for index in chunks:
+                    pending.append((index, pool.submit(self._fetch_chunk_data, index)))
+                    if len(pending) >= self.connections * 2:
+                        self._append(f, *pending.popleft())
+                while pending:
+                    self._append(f, *pending.popleft())
+            except BaseException:
+                self.stop_event.set()
+                raise
+
+    def _fetch_chunk_data(self, index):
+        buffer = io.BytesIO()
+        self._fetch_chunk(index, buffer)
+        return buffer.getvalue()
+
+    def _append(self, f, index, future):
+        f.write(future.result())
+        f.flush()
+        self.done.add(index)
+        self.save_state()
+
+    def _fetch_chunk(self, index, buffer=None):
+        start = index * self.chunk_size
+        end = min(start + self.chunk_size, self.size) - 1
+        for attempt in range(self.retries + 1):
+            received = 0
+            try:
+                request = urllib.request.Request(self.url, headers={"Range": f"bytes={start}-{end}"})
+                with urllib.request.urlopen(request, timeout=self.timeout) as response, \
+                        (contextlib.nullcontext(buffer) if buffer is not None else open(self.part_path, "r+b")) as f:
+                    if response.status != 206:
+                        raise OSError(f"Server answered a range request with HTTP {response.status}")
+                    f.seek(start if buffer is None else 0)
+                    while block := response.read(256 * 1024):
+                        if self.stop_event.is_set():
+                            raise InterruptedError("Download stopped")
+                        f.write(block)
+                        received += len(block)
+                        self.progress(len(block))
+                if received != end - start + 1:
+                    raise OSError(f"Chunk {index} ended after {received} of {end - start + 1} bytes")
+                break
+            except OSError:
+                # Take back what this attempt reported; the chunk starts over
+                self.progress(-received)
+                if attempt == self.retries or self.stop_event.is_set():
+                    raise
+                time.sleep(2 ** attempt)
+        if buffer is None:
+            with self.lock:
+                self.done.add(index)
+                self.save_state()
+
+    def _fetch_whole(self):
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response, open(self.part_path, "wb") as f:
+            while block := response.read(256 * 1024):
+                if self.stop_event.is_set():
+                    raise InterruptedError("Download stopped")
+                f.write(block)
+                self.progress(len(block))
+
+
+def download_all(downloads):
+    """Run several RangeDownloads at once; the first failure stops the others and is re-raised."""
+    with ThreadPoolExecutor(max_workers=len(downloads)) as pool:
+        futures = [pool.submit(download.run) for download in downloads]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for download in downloads:
+                download.stop_event.set()
+            raise
+
+
+def merge_streams(video_file, audio_file, output_path, ffmpeg="ffmpeg"):
+    """
+    Mux separately downloaded video and audio into output_path without re-encoding.
+
+    Without an audio file the video is simply moved into place.
+    """
+    if audio_file is None:
+        os.replace(video_file, output_path)
+        return output_path
+    subprocess.run([
+        ffmpeg, '-y', '-loglevel', 'error', '-i', video_file, '-i', audio_file,
+        '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', output_path
+    ], check=True)
+    os.remove(video_file)
+    os.remove(audio_file)
+    return output_path
+
+
+def stream_height(stream):
+    try:
+        return int(stream.resolution.rstrip("p"))
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+def select_streams(streams, profile="full", min_height=SLIDES_MIN_HEIGHT):
+    """
+    Pick the streams to download from a pytubefix StreamQuery.
+
+    "full" takes 1080p (or the best) MP4 video plus the best MP4 audio.
+    "slides" takes the smallest MP4 video of at least min_height, preferring
+    H.264 which every OpenCV build decodes, and no audio.
+
+    Returns:
+        tuple: (video stream, audio stream or None)
+    """
+    if profile == "slides":
+        videos = [s for s in streams.filter(adaptive=True, only_video=True, file_extension='mp4') if stream_height(s)]
+        if not videos:
+            raise Exception("No suitable video stream found")
+        legible = [s for s in videos if stream_height(s) >= min_height] or \
+            [max(videos, key=stream_height)]
+        height = min(stream_height(s) for s in legible)
+        candidates = [s for s in legible if stream_height(s) == height]
+        video_stream = min(candidates, key=lambda s: (not str(s.video_codec).startswith("avc1"), s.filesize))
+        return video_stream, None
+
+    video_stream = (
+        streams.filter(progressive=False, file_extension='mp4', res="1080p").first() or
+        streams.filter(progressive=False, file_extension='mp4').order_by('resolution').desc().first()
+    )
+    if not video_stream:
+        raise Exception("No suitable video stream found")
+    audio_stream = streams.filter(only_audio=True, file_extension='mp4').order_by('abr').desc().first()
+    if not audio_stream:
+        raise Exception("No audio stream found")
+    return video_stream, audio_stream
+
+
+def format_eta(seconds):
+    # Format as HH:MM:SS or MM:SS
+    if seconds > 3600:
+        return str(timedelta(seconds=int(seconds)))
+    return time.strftime("%M:%S", time.gmtime(seconds))
+
+
 class YouTubeDownloader:
     def __init__(self, root):
         self.root = root
         self.root.title("Mediocre YouTube Downloader")
-        self.root.geometry("500x350")  # Slightly taller for time estimate
-        
+        self.root.geometry("500x380")  # Slightly taller for time estimate and profile
+
         # Configure styles
         self.style = ttk.Style()
         self.style.configure("TLabel", font=("Arial", 10))
         self.style.configure("TButton", font=("Arial", 10))
-        
-        # Track download stats
+
+        # Track download stats; the worker thread adds to received, the Tk thread polls it
         self.start_time = None
-        self.last_bytes = 0
-        
+        self.received = 0
+        self.total = 0
+        self.lock = threading.Lock()
+        self.downloading = False
+        self.profile = tk.StringVar(value=PROFILES["full"])
+        self.extract_slides = tk.BooleanVar(value=False)
+
         # Create widgets
         self.create_widgets()
-        
+
     def create_widgets(self):
         # URL Entry
         ttk.Label(self.root, text="YouTube URL:").pack(pady=(20, 5))
         self.url_entry = ttk.Entry(self.root, width=50)
         self.url_entry.pack()
-        
+
+        # Profile
+        ttk.Combobox(self.root, values=list(PROFILES.values()), textvariable=self.profile,
+                     state="readonly", width=40).pack(pady=(10, 0))
+        ttk.Checkbutton(self.root, text="Extract slides while downloading (slides profile)",
+                        variable=self.extract_slides).pack(pady=(5, 0))
+
         # Download Button
         self.download_btn = ttk.Button(
-            self.root, 
-            text="Download", 
+            self.root,
+            text="Download",
             command=self.download_video
         )
         self.download_btn.pack(pady=20)
-        
+
         # Progress Bar
         self.progress = ttk.Progressbar(
-            self.root, 
-            orient="horizontal", 
-            length=300, 
+            self.root,
+            orient="horizontal",
+            length=300,
             mode="determinate"
         )
         self.progress.pack()
-        
+
         # Time remaining label
         self.time_label = ttk.Label(self.root, text="Estimated time: --")
         self.time_label.pack(pady=5)
-        
+
         # Status Label
         self.status_label = ttk.Label(self.root, text="")
         self.status_label.pack(pady=5)
-        
+
     def download_video(self):
         url = self.url_entry.get().strip()
         if not url:
             messagebox.showerror("Error", "Please enter a YouTube URL")
             return
-            
+
+        self.download_btn.config(state="disabled")
+        self.status_label.config(text="Connecting...")
+        self.time_label.config(text="Estimated time: --")
+        profile = next(key for key, label in PROFILES.items() if label == self.profile.get())
+        threading.Thread(target=self.resolve_streams, args=(url, profile), daemon=True).start()
+
+    def resolve_streams(self, url, profile):
         try:
-            self.download_btn.config(state="disabled")
-            self.status_label.config(text="Connecting...")
-            self.time_label.config(text="Estimated time: --")
-            self.root.update()
-            
-            yt = YouTube(url, on_progress_callback=self.update_progress)
-            self.status_label.config(text=f"Downloading: {yt.title[:50]}...")
-            
-            # Get video stream
-            video_stream = (
-                yt.streams.filter(progressive=False, file_extension='mp4', res="1080p").first() or
-                yt.streams.filter(progressive=False, file_extension='mp4').order_by('resolution').desc().first()
-            )
-            
-            if not video_stream:
-                raise Exception("No suitable video stream found")
-            
-            # Get audio stream
-            audio_stream = yt.streams.filter(only_audio=True, file_extension='mp4').order_by('abr').desc().first()
-            if not audio_stream:
-                raise Exception("No audio stream found")
-            
-            # Ask for save location
-            save_path = filedialog.asksaveasfilename(
-                defaultextension=".mp4",
-                filetypes=[("MP4 files", "*.mp4")],
-                initialfile=f"{yt.title[:30]}.mp4".replace("/", "-")
-            )
-            if not save_path:
-                return
-                
-            # Reset progress tracking
-            self.start_time = time.time()
-            self.last_bytes = 0
-            
-            # Download video and audio
-            self.status_label.config(text="Downloading video...")
-            video_file = video_stream.download(filename="video.mp4")
-            
-            self.status_label.config(text="Downloading audio...")
-            self.start_time = time.time()  # Reset timer for audio download
-            self.last_bytes = 0
-            audio_file = audio_stream.download(filename="audio_temp.mp4")
-            
-            # Combine streams
-            self.status_label.config(text="Combining video and audio...")
-            self.time_label.config(text="Estimated time: merging...")
-            subprocess.run([
-                'ffmpeg', '-i', video_file, '-i', audio_file,
-                '-c:v', 'copy', '-c:a', 'aac',
-                '-strict', 'experimental', save_path
-            ], check=True)
-            
-            # Clean up
-            os.remove(video_file)
-            os.remove(audio_file)
-            
-            messagebox.showinfo("Success", f"Video saved as:\n{save_path}")
-            
+            from pytubefix import YouTube
+            yt = YouTube(url)
+            video_stream, audio_stream = select_streams(yt.streams, profile)
+            self.root.after(0, self.choose_destination, yt.title, video_stream, audio_stream)
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.root.after(0, self.download_finished, None, e)
+
+    def choose_destination(self, title, video_stream, audio_stream):
+        # Ask for save location
+        save_path = filedialog.asksaveasfilename(
+            defaultextension=".mp4",
+            filetypes=[("MP4 files", "*.mp4")],
+            initialfile=f"{title[:30]}.mp4".replace("/", "-")
+        )
+        if not save_path:
+            self.download_finished(None)
+            return
+
+        # Reset progress tracking
+        self.start_time = time.time()
+        self.received = 0
+        self.total = video_stream.filesize + (audio_stream.filesize if audio_stream else 0)
+        self.downloading = True
+        self.status_label.config(text=f"Downloading: {title[:50]}...")
+        extract = self.extract_slides.get() and audio_stream is None
+        threading.Thread(target=self.run_download, args=(video_stream, audio_stream, save_path, extract),
+                         daemon=True).start()
+        self.root.after(100, self.poll_progress)
+
+    def add_progress(self, count):
+        with self.lock:
+            self.received += count
+
+    def run_download(self, video_stream, audio_stream, save_path, extract=False):
+        downloaded = threading.Event()
+        extraction = ThreadPoolExecutor(max_workers=1) if extract else None
+        try:
+            # Partial files sit next to the destination, so downloading to it again resumes them
+            if audio_stream is None:
+                downloads = [RangeDownload(video_stream.url, save_path, video_stream.filesize,
+                                           progress=self.add_progress, in_order=extract)]
+            else:
+                downloads = [
+                    RangeDownload(video_stream.url, save_path + ".video.mp4", video_stream.filesize,
+                                  progress=self.add_progress),
+                    RangeDownload(audio_stream.url, save_path + ".audio.m4a", audio_stream.filesize,
+                                  connections=2, progress=self.add_progress),
+                ]
+            slides = extraction.submit(self.run_extraction, save_path, downloaded) if extract else None
+            try:
+                files = download_all(downloads)
+            finally:
+                downloaded.set()
+            if audio_stream is not None:
+                self.root.after(0, self.status_label.config, {"text": "Combining video and audio..."})
+                merge_streams(files[0], files[1], save_path)
+            if slides is not None:
+                self.root.after(0, self.status_label.config, {"text": "Extracting the last slides..."})
+                slides = slides.result()
+            self.root.after(0, self.download_finished, save_path, None, slides)
+        except Exception as e:
+            self.root.after(0, self.download_finished, None, e)
         finally:
-            self.download_btn.config(state="normal")
-            self.progress["value"] = 0
-            self.status_label.config(text="")
-            self.time_label.config(text="Estimated time: --")
-            
-    def update_progress(self, stream, chunk, bytes_remaining):
-        total_size = stream.filesize
-        bytes_downloaded = total_size - bytes_remaining
-        percentage = (bytes_downloaded / total_size) * 100
-        self.progress["value"] = percentage
-        
+            if extraction:
+                extraction.shutdown(wait=False)
+
+    def run_extraction(self, video_path, downloaded):
+        """Extract slides from video_path while it downloads, into <video name>_slides."""
+        from main_extract import UltimateSlideProcessor
+        output_folder = os.path.splitext(video_path)[0] + "_slides"
+        processor = UltimateSlideProcessor(video_path=video_path, output_folder=output_folder,
+                                           stream=True, stream_finished=downloaded.is_set)
+        if not processor.process_video():
+            raise Exception(f"Slide extraction failed: {processor.progress.error or 'stopped'}")
+        return output_folder, processor.counts["unique"]
+
+    def poll_progress(self):
+        if not self.downloading:
+            return
+        with self.lock:
+            bytes_downloaded = self.received
+        self.progress["value"] = (bytes_downloaded / self.total) * 100 if self.total else 0
+
         # Calculate download speed and time remaining
-        current_time = time.time()
-        elapsed_time = current_time - self.start_time
-        
-        if elapsed_time > 0:
+        elapsed_time = time.time() - self.start_time
+        if bytes_downloaded >= self.total:
+            self.time_label.config(text="Estimated time: merging...")
+        elif elapsed_time > 0 and bytes_downloaded > 0:
             download_speed = bytes_downloaded / elapsed_time  # bytes per second
-            remaining_bytes = total_size - bytes_downloaded
-            if download_speed > 0:
-                remaining_time = remaining_bytes / download_speed
-                # Format as HH:MM:SS or MM:SS
-                if remaining_time > 3600:
-                    time_str = str(timedelta(seconds=int(remaining_time)))
-                else:
-                    time_str = time.strftime("%M:%S", time.gmtime(remaining_time))
-                self.time_label.config(text=f"Estimated time: {time_str}")
-        
-        self.root.update()
+            remaining_time = (self.total - bytes_downloaded) / download_speed
+            self.time_label.config(text=f"Estimated time: {format_eta(remaining_time)}")
+        self.root.after(100, self.poll_progress)
+
+    def download_finished(self, save_path, error=None, slides=None):
+        self.downloading = False
+        if error is not None:
+            messagebox.showerror("Error", f"An error occurred:\n{str(error)}")
+        elif save_path:
+            message = f"Video saved as:\n{save_path}"
+            if slides:
+                message += f"\n\n{slides[1]} slides extracted to:\n{slides[0]}"
+            messagebox.showinfo("Success", message)
+        self.download_btn.config(state="normal")
+        self.progress["value"] = 0
+        self.status_label.config(text="")
+        self.time_label.config(text="Estimated time: --")
 
 if __name__ == "__main__":
     root = tk.Tk()